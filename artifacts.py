@@ -0,0 +1,285 @@
+import mmap
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import tracing
+from storage import evict_lru
+
+# 세션/작업별 생성 결과(편지 음성, 노래)를 보관하는 아티팩트 저장소입니다.
+# 모든 결과는 ARTIFACT_ROOT 아래 sessions/<세션 id>/, jobs/<작업 id>/, scratch/에 저장되므로
+# 동시에 접속한 세션끼리 같은 파일을 덮어쓰지 않으며, 전체 크기가 ARTIFACT_MAX_BYTES를 넘으면
+# 가장 오래 사용하지 않은 파일부터 지웁니다. 파일은 임시 파일에 쓴 뒤 이름을 바꿔 한 번에 교체합니다.
+#
+# ARTIFACT_SERVER_PORT를 설정하면 저장소를 HTTP Range 요청으로 제공하는 서버를 열고,
+# 화면에서는 오디오 바이트 대신 URL을 넘겨 브라우저가 필요한 구간만 mmap에서 직접 받아 가게 합니다.
+
+ARTIFACT_ROOT = os.getenv("ARTIFACT_ROOT", os.path.join(".cache", "artifacts"))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # 2GB
+ARTIFACT_SERVER_PORT = os.getenv("ARTIFACT_SERVER_PORT")
+# 서버가 받을 주소. 세션 음성(복제한 목소리 포함)을 인증 없이 제공하므로 기본값은 이 컴퓨터에서만 접근 가능한 주소이며,
+# 다른 컴퓨터의 브라우저에는 리버스 프록시를 거쳐 제공하는 것을 권장합니다.
+ARTIFACT_SERVER_HOST = os.getenv("ARTIFACT_SERVER_HOST", "127.0.0.1")
+ARTIFACT_PUBLIC_URL = os.getenv("ARTIFACT_PUBLIC_URL")  # 브라우저에서 접근할 서버 주소 (기본값: http://localhost:<포트>)
+ARTIFACT_AUDIO_CACHE_ITEMS = int(os.getenv("ARTIFACT_AUDIO_CACHE_ITEMS", "16"))
+ARTIFACT_SWEEP_INTERVAL = int(os.getenv("ARTIFACT_SWEEP_INTERVAL", "32"))  # 몇 번 경로를 발급할 때마다 용량을 점검할지
+
+# 아직 쓰는 중인 파일 (정리 대상에서 제외)
+_IN_PROGRESS_SUFFIXES = (".tmp", ".part", ".src")
+_SERVE_CHUNK_SIZE = 256 * 1024
+_LOW_WATER_RATIO = 0.9  # 한도를 넘으면 이 비율까지 비웁니다
+_EMPTY_DIR_TTL = 3600  # 비워진 지 이만큼(초) 지난 디렉터리만 지웁니다
+
+
+def _safe_name(name):
+    # 세션/작업 id를 디렉터리 이름으로 쓸 수 있게 바꿉니다 (경로 구분자, ".." 등 제거).
+    return re.sub(r"[^0-9A-Za-z_.-]+", "-", str(name)).strip(".-") or "default"
+
+
+class ArtifactStore:
+    """
+    세션/작업별 결과 파일 경로를 내주고 크기 제한(LRU 정리)을 관리하는 저장소입니다.
+    """
+
+    def __init__(self, root=ARTIFACT_ROOT, max_bytes=ARTIFACT_MAX_BYTES, audio_cache_items=ARTIFACT_AUDIO_CACHE_ITEMS,
+                 sweep_interval=ARTIFACT_SWEEP_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.low_water_bytes = int(max_bytes * _LOW_WATER_RATIO)
+        self.sweep_interval = max(1, sweep_interval)
+        self.audio_cache_items = audio_cache_items
+        self.public_url = None  # 서버를 열면 설정됩니다
+        self._audio_cache = OrderedDict()  # (경로, 수정 시각, 크기) → 오디오 바이트
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._counters = {
+            "allocations": 0, "sweeps": 0, "bytes": 0, "evictions": 0, "evicted_bytes": 0,
+            "audio_cache_hits": 0, "audio_reads": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+        tracing.add(f"artifacts_{name}", amount)
+
+    def _allocate(self, *parts):
+        path = os.path.join(self.root, *parts)
+        with self._lock:
+            self._counters["allocations"] += 1
+            due = (self._counters["allocations"] - 1) % self.sweep_interval == 0
+        # 새 결과를 쓰기 전에 한도를 넘은 오래된 결과를 정리합니다 (sweep_interval번 발급마다 한 번).
+        # 정리가 끝난 뒤에 디렉터리를 만들므로 발급한 경로의 디렉터리는 항상 남아 있습니다.
+        if due and self._sweep_lock.acquire(blocking=False):
+            try:
+                self._sweep()
+            finally:
+                self._sweep_lock.release()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def session_path(self, session_id, name):
+        """
+        세션 전용 파일 경로를 반환합니다 (예: sessions/<세션 id>/letter.mp3).
+        :param session_id: 세션 id (Streamlit 세션마다 하나)
+        :param name: 파일 이름
+        :return: 파일 경로
+        """
+        return self._allocate("sessions", _safe_name(session_id), _safe_name(name))
+
+    def job_path(self, job_id, name):
+        """
+        작업 전용 파일 경로를 반환합니다 (예: jobs/<작업 id>/song.mp3).
+        같은 내용의 작업은 같은 id를 가지므로 세션이 달라도 결과 파일을 함께 씁니다.
+        """
+        return self._allocate("jobs", _safe_name(job_id), _safe_name(name))
+
+    def scratch_path(self, suffix=".mp3"):
+        """
+        세션/작업에 속하지 않는 호출을 위한 겹치지 않는 임시 결과 경로를 반환합니다.
+        """
+        return self._allocate("scratch", f"{uuid.uuid4().hex}{suffix}")
+
+    def contains(self, path):
+        root = os.path.realpath(self.root)
+        return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+    def touch(self, path):
+        # 읽을 때마다 수정 시각을 갱신해 자주 쓰는 파일이 정리 대상에서 밀려나도록 합니다.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def read_audio(self, path):
+        """
+        오디오 파일을 바이트로 반환합니다. 같은 파일(경로, 수정 시각, 크기가 같음)은 메모리에서 바로 돌려주므로
+        화면이 다시 실행될 때마다 디스크에서 전체를 다시 읽지 않습니다.
+        :return: 오디오 바이트 또는 None (파일 없음)
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            data = self._audio_cache.get(key)
+            if data is not None:
+                self._audio_cache.move_to_end(key)
+        if data is not None:
+            self._count("audio_cache_hits")
+            return data
+        with open(path, "rb") as f:
+            data = f.read()
+        self._count("audio_reads")
+        with self._lock:
+            self._audio_cache[key] = data
+            while len(self._audio_cache) > self.audio_cache_items:
+                self._audio_cache.popitem(last=False)
+        return data
+
+    def audio_source(self, path):
+        """
+        st.audio에 넘길 오디오 소스를 반환합니다.
+        아티팩트 서버가 열려 있으면 Range 요청을 지원하는 URL을, 아니면 메모리에 캐시한 바이트를 반환합니다.
+        :return: URL, 바이트 또는 None (파일이 정리되었거나 없음)
+        """
+        if not path or not os.path.exists(path):
+            return None
+        self.touch(path)
+        if self.public_url and self.contains(path):
+            relative = os.path.relpath(os.path.realpath(path), os.path.realpath(self.root)).replace(os.sep, "/")
+            # 같은 경로에 새 결과가 덮어써져도 브라우저가 이전 오디오를 재사용하지 않도록 수정 시각을 붙입니다.
+            return f"{self.public_url}/{relative}?v={os.stat(path).st_mtime_ns}"
+        return self.read_audio(path)
+
+    def _sweep(self):
+        total, evicted = evict_lru(self.root, self.max_bytes, self.low_water_bytes, _IN_PROGRESS_SUFFIXES,
+                                   empty_dir_ttl=_EMPTY_DIR_TTL)
+        with self._lock:
+            self._counters["sweeps"] += 1
+            self._counters["bytes"] = total
+            self._counters["evictions"] += len(evicted)
+            self._counters["evicted_bytes"] += sum(size for _, size in evicted)
+
+    def stats(self):
+        """
+        경로 발급/정리/오디오 캐시 횟수와 마지막 점검 때의 전체 크기(bytes)를 반환합니다.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            counters["audio_cache_items"] = len(self._audio_cache)
+        return counters
+
+
+class _ArtifactHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        relative = unquote(urlsplit(self.path).path).lstrip("/")
+        path = os.path.join(self.store.root, relative)
+        if not relative or not self.store.contains(path) or not os.path.isfile(path):
+            return None
+        return path
+
+    @staticmethod
+    def _parse_range(header, size):
+        # "bytes=시작-끝", "bytes=시작-", "bytes=-마지막 N바이트" 형식의 단일 구간만 지원합니다.
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+        if not match or match.groups() == ("", ""):
+            return None
+        start, end = match.groups()
+        if start == "":
+            length = min(int(end), size)
+            if length == 0:
+                return None  # "bytes=-0"은 만족할 수 있는 구간이 없습니다
+            return size - length, size - 1
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        if start >= size or start > end:
+            return None
+        return start, end
+
+    def _send(self, body):
+        path = self._resolve()
+        if path is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        if self.headers.get("Range") and size:
+            parsed = self._parse_range(self.headers["Range"], size)
+            if parsed is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            start, end = parsed
+            status = 206
+        self.store.touch(path)
+        self.send_response(status)
+        self.send_header("Content-Type", "audio/mpeg" if path.endswith(".mp3") else "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1 if size else 0))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not body or not size:
+            return
+        # 파일을 mmap으로 열어 요청한 구간만 복사 없이 소켓에 씁니다.
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(start, end + 1, _SERVE_CHUNK_SIZE):
+                    self.wfile.write(view[offset:min(end + 1, offset + _SERVE_CHUNK_SIZE)])
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 브라우저가 탐색하며 이전 요청을 끊은 경우
+            finally:
+                view.release()
+
+    def do_GET(self):
+        self._send(body=True)
+
+    def do_HEAD(self):
+        self._send(body=False)
+
+
+# 프로세스 전체에서 공유하는 기본 저장소
+artifact_store = ArtifactStore()
+tracing.register_gauges("artifacts", artifact_store.stats)
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_artifact_server(port=None, host=None, public_url=None, store=None):
+    """
+    저장소를 HTTP Range 요청으로 제공하는 서버를 백그라운드에서 엽니다.
+    여러 번 호출해도 한 번만 열리며, port와 ARTIFACT_SERVER_PORT가 모두 없으면 아무 일도 하지 않습니다.
+    :param host: 서버가 받을 주소 (기본값: ARTIFACT_SERVER_HOST)
+    :param public_url: 브라우저에서 접근할 서버 주소 (기본값: ARTIFACT_PUBLIC_URL 또는 http://localhost:<포트>)
+    :return: 서버 포트 또는 None
+    """
+    global _server
+    port = port if port is not None else ARTIFACT_SERVER_PORT
+    if port is None:
+        return None
+    host = host if host is not None else ARTIFACT_SERVER_HOST
+    store = store or artifact_store
+    with _server_lock:
+        if _server is None:
+            handler = type("ArtifactHandler", (_ArtifactHandler,), {"store": store})
+            _server = ThreadingHTTPServer((host, int(port)), handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="artifact-server", daemon=True).start()
+            bound_port = _server.server_address[1]
+            store.public_url = (public_url or ARTIFACT_PUBLIC_URL or f"http://localhost:{bound_port}").rstrip("/")
+        return _server.server_address[1]
@@ -0,0 +1,232 @@
+# python batch.py rows.csv --out-dir batch_output
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from artifacts import _safe_name
+from pipeline import GenerationPipeline, GenreFanout, genre_slug
+from rate_limit import configure_limiter, limiter_stats
+
+# 편지/가사/편지 음성/노래 묶음을 CSV 또는 JSONL 입력으로 대량 생성하는 헤드리스 배치 명령입니다.
+# 결과는 행 id 해시로 샤딩한 디렉터리에 저장하고, 행마다 manifest.jsonl에 결과를 한 줄씩 기록합니다.
+# 다시 실행하면 manifest에 성공으로 기록된 행은 건너뛰고 나머지부터 이어서 처리합니다.
+
+REQUIRED_FIELDS = ("recipient", "appreciation", "genre")
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def read_rows(path):
+    """
+    CSV 또는 JSONL 파일에서 행을 읽습니다. 확장자가 .jsonl/.json이면 JSONL로 읽습니다.
+    :param path: 입력 파일 경로
+    :return: dict 리스트
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.endswith((".jsonl", ".json")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    for index, row in enumerate(rows):
+        missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+        if missing:
+            raise ValueError(f"{index + 1}번째 행에 필수 항목이 없습니다: {', '.join(missing)}")
+    return rows
+
+
+def row_id(row):
+    """
+    행의 id 열을 쓰고, 없으면 입력 내용의 해시로 id를 만듭니다.
+    """
+    if row.get("id"):
+        return str(row["id"])
+    raw = json.dumps({key: row.get(key) for key in sorted(row)}, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def row_dir(out_dir, rid):
+    # 한 디렉터리에 수천 개의 결과가 몰리지 않도록 id 해시 앞 두 글자로 샤딩합니다.
+    # id는 입력 파일에서 온 값이므로 경로 구분자나 ".."가 out_dir 밖을 가리키지 않도록 정리하고,
+    # 정리하면서 바뀐 id는 다른 id와 겹치지 않도록 해시를 덧붙입니다 (원래 id는 manifest에만 기록).
+    digest = hashlib.sha256(rid.encode("utf-8")).hexdigest()
+    name = _safe_name(rid)
+    if name != rid:
+        name = f"{name}-{digest[:8]}"
+    return os.path.join(out_dir, digest[:2], name)
+
+
+def load_checkpoint(manifest_path):
+    """
+    manifest에서 이미 성공한 행 id 집합을 읽습니다.
+    """
+    done = set()
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 중단되며 잘린 마지막 줄은 무시합니다
+            if entry.get("status") == "ok":
+                done.add(entry["id"])
+    return done
+
+
+def row_genres(row):
+    """
+    genre 열에 "Ballad|Jazz"처럼 여러 장르를 |로 구분해 적으면 장르 목록으로 나눕니다.
+    """
+    return [genre.strip() for genre in row["genre"].split("|") if genre.strip()]
+
+
+def _write_lyrics(directory, title, lyrics):
+    path = os.path.join(directory, "lyrics.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"title: {title}\nlyrics: {lyrics}\n")
+    return path
+
+
+def process_row(row, out_dir, suno_api_key, with_song=True):
+    """
+    한 행에 대해 편지, 편지 음성, 가사, 노래를 생성하고 결과 항목을 반환합니다.
+    장르가 여러 개이면 편지와 편지 음성은 한 번만 만들고, 장르별 가사/노래는 병렬로 생성해
+    <행 디렉터리>/<장르>/ 아래에 저장합니다.
+    """
+    rid = row_id(row)
+    tracing.set_correlation_id(rid)  # 이 행에서 실행되는 모든 span을 행 id로 묶습니다
+    directory = row_dir(out_dir, rid)
+    os.makedirs(directory, exist_ok=True)
+    genres = row_genres(row)
+    if len(genres) > 1:
+        stages = ("letter", "tts")
+    else:
+        stages = ("letter", "tts", "lyrics", "song") if with_song else ("letter", "tts", "lyrics")
+
+    start = time.perf_counter()
+    pipeline = GenerationPipeline(
+        row["recipient"], row["appreciation"], int(row.get("min_wc") or 30), genres[0],
+        gender=row.get("gender") or "여성", voice_id=row.get("voice_id") or None,
+        suno_api_key=suno_api_key, stages=stages,
+        tts_output=os.path.join(directory, "letter.mp3"),
+        song_output=os.path.join(directory, "song.mp3"),
+    ).start()
+
+    entry = {"id": rid, "dir": directory, "errors": {}}
+    fanout = None
+    for stage, future in pipeline.futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            entry["errors"][stage] = str(e)
+            continue
+        if stage == "letter":
+            with open(os.path.join(directory, "letter.txt"), "w", encoding="utf-8") as f:
+                f.write(result)
+            entry["letter"] = os.path.join(directory, "letter.txt")
+            if len(genres) > 1:
+                # 편지 음성 변환과 동시에 장르별 가사 생성을 시작합니다.
+                fanout = GenreFanout(
+                    row["recipient"], row["appreciation"], result, genres,
+                    suno_api_key=suno_api_key, with_songs=with_song, song_output_dir=directory,
+                ).start()
+        elif stage == "lyrics":
+            title, lyrics = result
+            if not lyrics:
+                entry["errors"][stage] = title
+                continue
+            entry["title"] = title
+            entry["lyrics"] = _write_lyrics(directory, title, lyrics)
+        elif result:
+            entry[stage] = result
+        else:
+            entry["errors"][stage] = "결과 파일이 생성되지 않았습니다."
+
+    if fanout is not None:
+        entry["genres"] = {}
+        for genre, stage, result in fanout.events():
+            genre_entry = entry["genres"].setdefault(genre, {})
+            if isinstance(result, Exception):
+                entry["errors"][f"{stage}:{genre}"] = str(result)
+            elif stage == "lyrics":
+                title, lyrics = result
+                if not lyrics:
+                    entry["errors"][f"{stage}:{genre}"] = title
+                    continue
+                genre_dir = os.path.join(directory, genre_slug(genre))
+                os.makedirs(genre_dir, exist_ok=True)
+                genre_entry["title"] = title
+                genre_entry["lyrics"] = _write_lyrics(genre_dir, title, lyrics)
+            else:
+                genre_entry["song"] = result
+
+    entry["status"] = "failed" if entry["errors"] else "ok"
+    entry["timings"] = pipeline.timings
+    entry["elapsed"] = time.perf_counter() - start
+    return entry
+
+
+def run_batch(input_path, out_dir, workers=4, max_openai=4, max_elevenlabs=2, max_suno=2, with_song=True, suno_api_key=None):
+    """
+    입력 파일의 모든 행을 제한된 동시성으로 처리하고 manifest.jsonl에 결과를 기록합니다.
+    :return: (성공 수, 실패 수, 건너뛴 수)
+    """
+    rows = read_rows(input_path)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    done = load_checkpoint(manifest_path)
+    pending = [row for row in rows if row_id(row) not in done]
+
+    # 업스트림별 동시 요청 수 제한 (프로세스 전체 속도 제한기에 반영되어 모든 행이 공유)
+    configure_limiter("openai", max_in_flight=max_openai)
+    configure_limiter("elevenlabs", max_in_flight=max_elevenlabs)
+    configure_limiter("suno", max_in_flight=max_suno)
+    write_lock = threading.Lock()
+    counts = {"ok": 0, "failed": 0}
+
+    def handle(row):
+        try:
+            entry = process_row(row, out_dir, suno_api_key, with_song)
+        except Exception as e:
+            entry = {"id": row_id(row), "status": "failed", "errors": {"row": str(e)}}
+        with write_lock:
+            with open(manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            counts[entry["status"]] += 1
+            print(f"[{counts['ok'] + counts['failed']}/{len(pending)}] {entry['id']}: {entry['status']}")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        list(pool.map(handle, pending))
+    return counts["ok"], counts["failed"], len(rows) - len(pending)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MelodyGram 편지/노래 배치 생성")
+    parser.add_argument("input", help="recipient, appreciation, genre, gender 열을 가진 CSV 또는 JSONL 파일 (genre는 |로 여러 개 지정 가능)")
+    parser.add_argument("--out-dir", default="batch_output", help="결과 저장 디렉터리 (기본값: batch_output)")
+    parser.add_argument("--workers", type=int, default=4, help="동시에 처리할 행 수")
+    parser.add_argument("--max-openai", type=int, default=4, help="OpenAI 동시 요청 수")
+    parser.add_argument("--max-elevenlabs", type=int, default=2, help="ElevenLabs 동시 요청 수")
+    parser.add_argument("--max-suno", type=int, default=2, help="Suno 동시 요청 수")
+    parser.add_argument("--no-song", action="store_true", help="노래 생성을 건너뜁니다")
+    args = parser.parse_args(argv)
+
+    ok, failed, skipped = run_batch(
+        args.input, args.out_dir, workers=args.workers,
+        max_openai=args.max_openai, max_elevenlabs=args.max_elevenlabs, max_suno=args.max_suno,
+        with_song=not args.no_song, suno_api_key=os.getenv("SUNO_API_KEY"),
+    )
+    print(f"완료: 성공 {ok}, 실패 {failed}, 건너뜀 {skipped}")
+    for provider, stats in limiter_stats().items():
+        print(f"{provider}: 요청 {stats['acquired']}건, 평균 대기 {stats['avg_wait']:.2f}초, 최대 대기 {stats['max_wait']:.2f}초")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
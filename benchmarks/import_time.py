@@ -0,0 +1,90 @@
+# python benchmarks/import_time.py --max-ms 300
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# func.py를 불러오는 데 걸리는 시간을 `python -X importtime`으로 측정하고,
+# 무거운 SDK가 import 시점에 딸려 들어오거나 예산을 넘으면 0이 아닌 종료 코드를 반환합니다.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# func를 불러올 때 함께 불러오면 안 되는 무거운 모듈 (실제로 사용하는 함수 안에서 가져와야 함)
+DEFERRED_MODULES = ("openai", "pydub", "streamlit")
+
+
+def measure(module="func"):
+    """
+    새 인터프리터에서 모듈을 한 번 불러오고 import 시간과 함께 불러온 무거운 모듈을 반환합니다.
+    :return: {"total_ms", "self_ms", "top": [(누적 ms, 모듈)], "loaded_deferred": [...]}
+    """
+    code = (
+        f"import {module}; import sys, json; "
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+
+    # stderr 형식: "import time: self [us] | cumulative | imported package"
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(self_us), int(cumulative_us), name.rstrip()))
+
+    target = next((e for e in reversed(entries) if e[2].strip() == module), None)
+    if target is None:
+        raise RuntimeError(f"importtime 출력에서 '{module}'을(를) 찾지 못했습니다.")
+    top_level = sorted(((cum, name.strip()) for _, cum, name in entries if not name.startswith("  ")), reverse=True)
+    return {
+        "total_ms": target[1] / 1000,
+        "self_ms": target[0] / 1000,
+        "top": [(cum / 1000, name) for cum, name in top_level[:10]],
+        "loaded_deferred": json.loads(result.stdout.strip().splitlines()[-1]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="func.py 콜드 스타트 import 시간 측정")
+    parser.add_argument("--module", default="func", help="측정할 모듈 (기본값: func)")
+    parser.add_argument("--repeat", type=int, default=5, help="반복 횟수 (중앙값 사용)")
+    parser.add_argument("--max-ms", type=float, default=None, help="허용하는 import 시간 상한 (ms)")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력합니다")
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    totals = sorted(run["total_ms"] for run in runs)
+    median = totals[len(totals) // 2]
+    loaded = sorted({m for run in runs for m in run["loaded_deferred"]})
+    report = {
+        "module": args.module,
+        "median_ms": median,
+        "min_ms": totals[0],
+        "max_ms": totals[-1],
+        "top": runs[-1]["top"],
+        "loaded_deferred": loaded,
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"import {args.module}: 중앙값 {median:.1f}ms (최소 {totals[0]:.1f}ms, 최대 {totals[-1]:.1f}ms, {args.repeat}회)")
+        for cum_ms, name in report["top"]:
+            print(f"  {cum_ms:8.1f}ms  {name}")
+
+    failed = False
+    if loaded:
+        print(f"실패: import 시점에 무거운 모듈이 로드되었습니다: {', '.join(loaded)}")
+        failed = True
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"실패: import 시간 {median:.1f}ms가 상한 {args.max_ms:.1f}ms를 넘었습니다.")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
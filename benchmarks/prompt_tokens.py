@@ -0,0 +1,138 @@
+# python benchmarks/prompt_tokens.py --letter-file letter.txt --summarize
+import argparse
+import json
+import os
+import sys
+
+# 가사 프롬프트의 토큰 수를 압축 전(편지 전문 + 반복되는 받는 분/감사 내용) 템플릿과 현재 템플릿으로 비교하고,
+# 장르가 바뀌어도 바이트 단위로 같은 접두사가 몇 토큰인지 측정합니다 (제공자 측 접두사 캐시가 적용되는 부분).
+# tiktoken이 설치되어 있으면 실제 토크나이저로 세고, 없으면 rate_limit.estimate_tokens로 추정합니다.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import func  # noqa: E402
+from rate_limit import estimate_tokens  # noqa: E402
+
+GENRES = ("Ballad", "Dance", "Hip-Hop/Rap", "R&B/Soul", "Trot", "Indie", "Jazz")
+
+SAMPLE_LETTER = (
+    "사랑하는 어머니께. 어릴 적 비 오는 날마다 우산을 들고 학교 앞에서 기다려 주시던 모습이 아직도 생생합니다. "
+    "힘든 시기에 아무 말 없이 따뜻한 밥을 차려 주시며 곁을 지켜 주셔서, 저는 다시 일어설 수 있었습니다. "
+) * 6
+
+
+def legacy_lyrics_and_title_prompt(recipient, appreciation, letter, genre):
+    # 압축 전 템플릿 (비교용으로 그대로 보존)
+    return (
+        f"'{recipient}'에게 전하는 감사의 마음과 '{appreciation}'을(를) 주제로 한 한국 노래 제목과 가사를 작성해주세요.\n"
+        f"다음의 편지 내용을 참고하세요:\n\n"
+        f"편지 내용: '{letter}'\n\n"
+        f"가사는 아래 형식을 따르며, 끊김 없이 자연스럽게 작성해주세요:\n\n"
+        f"- Verse 1: '{recipient}'와의 관계를 소개하고 감사의 마음을 표현 (30~40 단어).\n"
+        f"- Chorus: '{recipient}'의 사랑과 조언이 삶에 미친 영향을 강조하며, 반복적이고 감동적인 메시지 (20~30 단어).\n"
+        f"- Verse 2: '{recipient}'와의 구체적인 추억을 기반으로 더 깊은 감정과 스토리를 전개 (30~40 단어).\n"
+        f"- Bridge: 감정을 최고조로 끌어올리며, '{recipient}'께 드리는 소망과 사랑의 메시지 (20~30 단어).\n"
+        f"- Chorus 반복: 동일한 후렴 반복.\n\n"
+        f"'{genre}' 스타일로 가사를 자연스럽고 세련되게 작성해주세요. 자연스럽게 영단어를 중간에 넣어도 좋습니다.\n\n"
+        f"출력 형식은 다음과 같이 해주세요:\n\n"
+        f"title: -\n"
+        f"lyrics: -\n\n"
+        f"예를 들어:\n\n"
+        f"title: 당신에게 바치는 노래\n"
+        f"lyrics: [Verse 1]\n"
+        f"당신과 함께한 시간들...\n"
+    )
+
+
+def token_counter():
+    """
+    (토큰 수 계산 함수, 계산 방식 이름)을 반환합니다.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return (lambda text: estimate_tokens([{"content": text}]) - 4), "estimate"
+    encoding = tiktoken.encoding_for_model("gpt-4")
+    return (lambda text: len(encoding.encode(text))), "tiktoken"
+
+
+def _serialize(messages):
+    # 제공자가 접두사를 비교하는 순서대로 메시지를 이어 붙입니다.
+    return "".join(f"<{m['role']}>{m['content']}" for m in messages)
+
+
+def measure(recipient, appreciation, letter, genres, letter_context=None):
+    """
+    장르별 압축 전/후 프롬프트 토큰 수와 장르 간 공통 접두사 토큰 수를 계산합니다.
+    :param letter_context: 가사 프롬프트에 넣을 편지 요약 (None이면 편지 전문을 그대로 사용)
+    """
+    count, method = token_counter()
+    letter_context = letter if letter_context is None else letter_context
+    legacy_system = "당신은 전문적인 노래 가사를 작성하는 도우미입니다."
+
+    rows = []
+    compact_prompts = []
+    for genre in genres:
+        legacy = _serialize([
+            {"role": "system", "content": legacy_system},
+            {"role": "user", "content": legacy_lyrics_and_title_prompt(recipient, appreciation, letter, genre)},
+        ])
+        compact = _serialize(func._lyrics_and_title_request(recipient, appreciation, letter_context, genre)["messages"])
+        compact_prompts.append(compact)
+        rows.append({"genre": genre, "before": count(legacy), "after": count(compact)})
+
+    shared_prefix = os.path.commonprefix(compact_prompts) if len(compact_prompts) > 1 else ""
+    before = sum(r["before"] for r in rows)
+    after = sum(r["after"] for r in rows)
+    return {
+        "token_counter": method,
+        "letter_chars": len(letter),
+        "letter_context_chars": len(letter_context),
+        "summarized": letter_context != letter,
+        "genres": rows,
+        "total_before": before,
+        "total_after": after,
+        "reduction": 1 - after / before if before else 0.0,
+        "shared_prefix_tokens": count(shared_prefix),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="가사 프롬프트 토큰 수 비교 (압축 전/후)")
+    parser.add_argument("--letter-file", help="편지 텍스트 파일 (기본값: 내장 예시 편지)")
+    parser.add_argument("--recipient", default="어머니")
+    parser.add_argument("--appreciation", default="항상 곁에서 응원해 주시고 힘들 때마다 버팀목이 되어 주셔서 감사합니다.")
+    parser.add_argument("--genres", default=",".join(GENRES), help="쉼표로 구분한 장르 목록")
+    parser.add_argument("--summarize", action="store_true", help="summarize_letter()로 편지 요약을 실제로 만들어 측정합니다 (OpenAI 호출)")
+    parser.add_argument("--summary-file", help="API 호출 없이 사용할 편지 요약 텍스트 파일")
+    parser.add_argument("--json", action="store_true", help="결과를 JSON으로 출력합니다")
+    args = parser.parse_args(argv)
+
+    letter = SAMPLE_LETTER
+    if args.letter_file:
+        with open(args.letter_file, encoding="utf-8") as f:
+            letter = f.read().strip()
+    genres = [g.strip() for g in args.genres.split(",") if g.strip()]
+    letter_context = None
+    if args.summarize:
+        letter_context = func.summarize_letter(letter)
+    elif args.summary_file:
+        with open(args.summary_file, encoding="utf-8") as f:
+            letter_context = f.read().strip()
+    report = measure(args.recipient, args.appreciation, letter, genres, letter_context)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    print(f"토큰 계산: {report['token_counter']}, 편지 {report['letter_chars']}자 → 프롬프트용 {report['letter_context_chars']}자"
+          f"{' (요약)' if report['summarized'] else ''}")
+    for row in report["genres"]:
+        print(f"  {row['genre']:12s} {row['before']:6d} → {row['after']:6d}")
+    print(f"합계 {report['total_before']} → {report['total_after']} ({report['reduction']:.0%} 감소), "
+          f"장르 간 공통 접두사 {report['shared_prefix_tokens']} 토큰")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+# python benchmarks/run.py --concurrency 8 --iterations 50 --output bench.json
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# 로컬 스텁 서버(stub_servers.py)를 띄우고 func.py의 주요 함수를 동시에 호출해
+# 지연 시간 분포(p50/p95/p99), 처리량, 최대 RSS, 주고받은 바이트 수를 측정한 뒤 JSON으로 저장합니다.
+# --compare로 이전 결과 파일을 주면 시나리오별 p50/p95와 처리량 변화를 함께 출력합니다.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stub_servers import DEFAULT_CONFIG, serve_in_process  # noqa: E402
+
+SCENARIOS = ("letter", "lyrics", "tts", "upload", "song")
+
+RECIPIENT = "어머니"
+APPRECIATION = "항상 곁에서 응원해 주셔서 감사합니다."
+LETTER = "사랑하는 어머니께. 항상 곁에서 응원해 주셔서 감사합니다. " * 20
+
+
+def percentile(values, q):
+    """
+    정렬된 값 리스트에서 선형 보간으로 백분위수를 구합니다.
+    """
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _configure_environment(urls, workdir, args):
+    # func와 그 의존 모듈은 설정을 import 시점에 읽으므로, 반드시 import 전에 호출해야 합니다.
+    os.environ.update({
+        "OPENAI_API_BASE": urls["openai"] + "/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "ELEVENLABS_BASE_URL": urls["elevenlabs"],
+        "ELEVENLABS_API_KEY": "benchmark",
+        "SUNO_BASE_URL": urls["suno"],
+        "SUNO_API_KEY": "benchmark",
+        "SUNO_POLL_INTERVAL": str(args.suno_poll_interval),
+        "RESULT_CACHE_DIR": os.path.join(workdir, "cache"),
+        "RESULT_CACHE_ENABLED": "1" if args.cache else "0",
+        "VOICE_REGISTRY_PATH": os.path.join(workdir, "voices.sqlite3"),
+        "HTTP_BACKOFF_BASE": "0.05",
+    })
+    # 스텁 서버는 호출 한도가 없으므로 클라이언트 쪽 한도도 벤치마크 설정으로 맞춥니다.
+    for provider in ("OPENAI", "ELEVENLABS", "SUNO"):
+        os.environ[f"{provider}_RPM"] = "0"
+        os.environ[f"{provider}_TPM"] = "0"
+        os.environ[f"{provider}_MAX_IN_FLIGHT"] = str(args.max_in_flight)
+
+
+def _build_scenarios(func, workdir, use_cache):
+    # 각 시나리오는 반복 번호를 받아 한 번 호출하고, 성공하면 결과(파일 경로나 문자열)를 반환합니다.
+    voice_sample = os.urandom(256 * 1024)
+
+    def out(name, i):
+        return os.path.join(workdir, "out", f"{name}-{i}.mp3")
+
+    def letter(i):
+        result = func.generate_letter(RECIPIENT, f"{APPRECIATION} #{i}", 300, use_cache=use_cache)
+        return None if result == func.ERROR_MESSAGE else result
+
+    def lyrics(i):
+        title, result = func.generate_lyrics_and_title(RECIPIENT, APPRECIATION, f"{LETTER} #{i}", "발라드", use_cache=use_cache)
+        return None if title == func.ERROR_MESSAGE else result
+
+    def tts(i):
+        return func.text_to_speech1(f"{LETTER} #{i}", "여성", output_file=out("tts", i), use_cache=use_cache)
+
+    def upload(i):
+        sample = io.BytesIO(voice_sample)
+        sample.name = f"voice-{i}.wav"
+        return func.upload_user_voice(sample)
+
+    def song(i):
+        return func.generate_and_save_song(f"[Verse]\n노래 {i}", f"제목 {i}", "발라드", out("song", i), "benchmark", use_cache=use_cache)
+
+    return {"letter": letter, "lyrics": lyrics, "tts": tts, "upload": upload, "song": song}
+
+
+def run_scenario(name, call, iterations, concurrency):
+    """
+    call을 iterations번, 동시에 concurrency개씩 실행하고 통계를 반환합니다.
+    """
+    latencies = []
+    errors = 0
+    bytes_written = 0
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            result = call(i)
+        except Exception as e:
+            print(f"[{name}] 오류 발생: {e}")
+            result = None
+        return time.perf_counter() - start, result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for elapsed, result in executor.map(timed, range(iterations)):
+            if result is None:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            if isinstance(result, str) and os.path.isfile(result):
+                bytes_written += os.path.getsize(result)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_s": wall,
+        "throughput_rps": (iterations - errors) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "bytes_written": bytes_written,
+    }
+
+
+def _peak_rss_bytes():
+    # 리눅스의 ru_maxrss는 KB, macOS는 바이트 단위입니다.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def compare(report, baseline):
+    """
+    두 결과의 시나리오별 p50/p95/처리량 변화율을 출력합니다.
+    """
+    print(f"\n기준 결과와 비교 ({baseline.get('started_at')}):")
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        changes = []
+        for field in ("p50_ms", "p95_ms", "throughput_rps"):
+            before, after = previous[field], current[field]
+            delta = (after - before) / before * 100 if before else 0.0
+            changes.append(f"{field} {before:.1f}→{after:.1f} ({delta:+.1f}%)")
+        print(f"  {name:8s} " + ", ".join(changes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="func.py 벤치마크 (로컬 스텁 서버 사용)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"실행할 시나리오 (쉼표 구분, 기본값: {','.join(SCENARIOS)})")
+    parser.add_argument("--iterations", type=int, default=20, help="시나리오별 호출 횟수")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시 호출 수")
+    parser.add_argument("--max-in-flight", type=int, default=16, help="업스트림별 클라이언트 동시 요청 한도")
+    parser.add_argument("--cache", action="store_true", help="결과 캐시를 켠 상태로 측정합니다 (기본값: 끔)")
+    parser.add_argument("--suno-poll-interval", type=float, default=0.2, help="Suno 상태 조회 간격 (초)")
+    parser.add_argument("--tracemalloc", action="store_true", help="파이썬 힙 최대 사용량도 측정합니다 (느려짐)")
+    parser.add_argument("--output", help="결과 JSON을 저장할 경로")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON 경로")
+    for key, value in DEFAULT_CONFIG.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value, help="스텁 서버 설정")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"알 수 없는 시나리오: {', '.join(sorted(unknown))}")
+    stub_config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+
+    # 스텁 서버는 별도 프로세스에서 실행해 측정 대상의 CPU/메모리에 섞이지 않게 합니다.
+    ready = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve_in_process, args=(stub_config, ready, stop), daemon=True)
+    server.start()
+    urls = ready.get(timeout=30)
+
+    workdir = tempfile.mkdtemp(prefix="melodygram-bench-")
+    os.makedirs(os.path.join(workdir, "out"))
+    _configure_environment(urls, workdir, args)
+
+    import func
+    import http_client
+    from rate_limit import limiter_stats
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    scenarios = _build_scenarios(func, workdir, args.cache)
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": {},
+    }
+    try:
+        for name in names:
+            result = run_scenario(name, scenarios[name], args.iterations, args.concurrency)
+            report["scenarios"][name] = result
+            print(
+                f"{name:8s} p50 {result['p50_ms']:8.1f}ms  p95 {result['p95_ms']:8.1f}ms  "
+                f"p99 {result['p99_ms']:8.1f}ms  {result['throughput_rps']:6.2f} req/s  오류 {result['errors']}"
+            )
+    finally:
+        stop.set()
+        server_stats = ready.get(timeout=30)
+        server.join(timeout=10)
+
+    report["peak_rss_bytes"] = _peak_rss_bytes()
+    if args.tracemalloc:
+        report["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    report["bytes_received"] = server_stats["bytes_sent"]
+    report["bytes_written"] = sum(s["bytes_written"] for s in report["scenarios"].values())
+    report["stub_server"] = server_stats
+    report["http_pool"] = http_client.pool_stats()
+    report["rate_limits"] = limiter_stats()
+    print(
+        f"최대 RSS {report['peak_rss_bytes'] / 1024 / 1024:.1f}MB, "
+        f"받은 바이트 {report['bytes_received']:,}, 쓴 바이트 {report['bytes_written']:,}"
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"결과를 '{args.output}'에 저장했습니다.")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# python benchmarks/stub_servers.py --latency-ms 200 --error-rate-429 0.05
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# OpenAI, ElevenLabs, Suno API를 흉내 내는 로컬 HTTP 서버입니다 (벤치마크/부하 테스트용).
+# 응답 지연 분포, 청크 단위 오디오 본문, 429/5xx 오류 주입, Suno식 비동기 작업 응답을 설정할 수 있습니다.
+
+DEFAULT_CONFIG = {
+    "latency_ms": 100.0,      # 응답 지연 중앙값
+    "latency_sigma": 0.5,     # 로그정규 분포의 시그마 (0이면 고정 지연)
+    "error_rate_429": 0.0,    # 429 응답 비율
+    "error_rate_5xx": 0.0,    # 503 응답 비율
+    "audio_bytes": 256 * 1024,
+    "audio_chunk_bytes": 16 * 1024,
+    "chunk_delay_ms": 5.0,    # 오디오/토큰 청크 사이 지연
+    "stream_tokens": 100,     # 스트리밍 응답의 조각 수
+    "suno_ready_s": 2.0,      # Suno 작업이 완료 상태가 되기까지의 시간
+}
+
+LETTER_TEXT = "사랑하는 어머니께. 항상 곁에서 응원해 주셔서 감사합니다. 함께한 모든 순간이 소중합니다. 늘 건강하세요. "
+LYRICS_TEXT = "title: 당신에게 바치는 노래\nlyrics: [Verse 1]\n당신과 함께한 시간들\n[Chorus]\n고마워요 사랑해요\n"
+
+
+def _fake_mp3(size):
+    # ID3 태그 + MP3 프레임 동기 바이트로 시작하는 더미 오디오 (형식 판별은 MP3로 됨)
+    frame = b"\xff\xfb\x90\x00" + b"\x00" * 413
+    body = b"ID3\x04\x00\x00\x00\x00\x00\x00"
+    return (body + frame * (size // len(frame) + 1))[:size]
+
+
+class StubState:
+    """
+    서버 간에 공유하는 설정과 통계입니다.
+    """
+
+    def __init__(self, config):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.audio = _fake_mp3(int(self.config["audio_bytes"]))
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.voices = {}
+        self.stats = {"requests": 0, "bytes_sent": 0, "injected_429": 0, "injected_5xx": 0}
+
+    def record(self, field, value=1):
+        with self.lock:
+            self.stats[field] += value
+
+    def latency(self):
+        median = self.config["latency_ms"] / 1000
+        sigma = self.config["latency_sigma"]
+        return median * math.exp(random.gauss(0, sigma)) if sigma else median
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive 지원
+    provider = None
+    state = None
+
+    def log_message(self, format, *args):
+        pass  # 요청마다 로그를 찍지 않습니다
+
+    # 공통 응답 도우미
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            return self.rfile.read(length)
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            data = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return b""
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.state.record("bytes_sent", len(body))
+
+    def _send_chunked(self, pieces, content_type):
+        # Transfer-Encoding: chunked로 조각 사이에 지연을 두고 보냅니다.
+        delay = self.state.config["chunk_delay_ms"] / 1000
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for piece in pieces:
+            self.wfile.write(f"{len(piece):x}\r\n".encode() + piece + b"\r\n")
+            self.wfile.flush()
+            self.state.record("bytes_sent", len(piece))
+            if delay:
+                time.sleep(delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _audio_chunks(self):
+        size = int(self.state.config["audio_chunk_bytes"])
+        audio = self.state.audio
+        return (audio[i:i + size] for i in range(0, len(audio), size))
+
+    def _handle(self, method):
+        self.state.record("requests")
+        body = self._read_body() if method in ("POST", "PUT") else b""
+        time.sleep(self.state.latency())
+
+        # 오류 주입
+        roll = random.random()
+        if roll < self.state.config["error_rate_429"]:
+            self.state.record("injected_429")
+            return self._send(429, {"error": "rate limited"}, headers={"Retry-After": "0"})
+        if roll < self.state.config["error_rate_429"] + self.state.config["error_rate_5xx"]:
+            self.state.record("injected_5xx")
+            return self._send(503, {"error": "unavailable"})
+
+        handler = getattr(self, f"_{self.provider}_{method.lower()}", None)
+        if handler is None or handler(body) is False:
+            self._send(404, {"error": "not found"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    # OpenAI
+    def _openai_post(self, body):
+        if not self.path.endswith("/chat/completions"):
+            return False
+        request = json.loads(body or b"{}")
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        text = LYRICS_TEXT if "title:" in prompt else LETTER_TEXT
+        if request.get("stream"):
+            tokens = max(1, int(self.state.config["stream_tokens"]))
+            step = max(1, math.ceil(len(text) / tokens))
+            events = []
+            for i in range(0, len(text), step):
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "model": request.get("model"),
+                         "choices": [{"index": 0, "delta": {"content": text[i:i + step]}, "finish_reason": None}]}
+                events.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            events.append(b"data: [DONE]\n\n")
+            return self._send_chunked(events, "text/event-stream")
+        return self._send(200, {
+            "id": "stub", "object": "chat.completion", "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(text), "total_tokens": len(prompt) + len(text)},
+        })
+
+    # ElevenLabs
+    def _elevenlabs_post(self, body):
+        if re.fullmatch(r"/v1/text-to-speech/[^/]+(/stream)?", self.path):
+            return self._send_chunked(self._audio_chunks(), "audio/mpeg")
+        if self.path == "/v1/voices/add":
+            voice_id = uuid.uuid4().hex[:20]
+            with self.state.lock:
+                self.state.voices[voice_id] = {"voice_id": voice_id, "name": "cloned", "category": "cloned", "labels": {}}
+            return self._send(200, {"voice_id": voice_id})
+        return False
+
+    def _elevenlabs_get(self, body):
+        if self.path != "/v1/voices":
+            return False
+        voices = [
+            {"voice_id": "Xb7hH8MSUJpSbSDYk0k2", "name": "Alice", "labels": {"gender": "female"}},
+            {"voice_id": "JBFqnCBsd6RMkjVDRZzb", "name": "George", "labels": {"gender": "male"}},
+        ]
+        with self.state.lock:
+            voices += list(self.state.voices.values())
+        etag = f'"{len(voices)}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304)
+        return self._send(200, {"voices": voices}, headers={"ETag": etag})
+
+    def _elevenlabs_delete(self, body):
+        voice_id = self.path.rsplit("/", 1)[-1]
+        with self.state.lock:
+            found = self.state.voices.pop(voice_id, None)
+        return self._send(200 if found else 404, {})
+
+    # Suno
+    def _suno_post(self, body):
+        if self.path != "/generate":
+            return False
+        task_id = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.jobs[task_id] = time.monotonic()
+        return self._send(200, {"id": task_id, "status": "queued"})
+
+    def _suno_get(self, body):
+        match = re.fullmatch(r"/feed/([0-9a-f]+)", self.path)
+        if match:
+            with self.state.lock:
+                submitted = self.state.jobs.get(match.group(1))
+            if submitted is None:
+                return self._send(404, {"error": "unknown task"})
+            if time.monotonic() - submitted < self.state.config["suno_ready_s"]:
+                return self._send(200, [{"id": match.group(1), "status": "queued", "audio_url": None}])
+            host, port = self.server.server_address[:2]
+            audio_url = f"http://{host}:{port}/audio/{match.group(1)}.mp3"
+            return self._send(200, [{"id": match.group(1), "status": "complete", "audio_url": audio_url}])
+        if self.path.startswith("/audio/"):
+            return self._send_chunked(self._audio_chunks(), "audio/mpeg")
+        return False
+
+
+def start_stub_servers(config=None, host="127.0.0.1"):
+    """
+    세 업스트림의 스텁 서버를 백그라운드 스레드에서 띄웁니다.
+    :param config: DEFAULT_CONFIG를 덮어쓸 설정
+    :return: (base URL dict, StubState, 서버 리스트)
+    """
+    state = StubState(config)
+    servers = []
+    urls = {}
+    for provider in ("openai", "elevenlabs", "suno"):
+        handler = type(f"{provider.title()}StubHandler", (StubHandler,), {"provider": provider, "state": state})
+        server = ThreadingHTTPServer((host, 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name=f"stub-{provider}", daemon=True).start()
+        servers.append(server)
+        urls[provider] = f"http://{host}:{server.server_address[1]}"
+    return urls, state, servers
+
+
+def stop_stub_servers(servers):
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def serve_in_process(config, ready_queue, stop_event):
+    """
+    별도 프로세스에서 스텁 서버를 실행합니다 (벤치마크 대상과 GIL/메모리를 나누지 않도록).
+    base URL을 ready_queue에 넣고 stop_event가 설정되면 통계를 넣고 종료합니다.
+    """
+    urls, state, servers = start_stub_servers(config)
+    ready_queue.put(urls)
+    stop_event.wait()
+    stop_stub_servers(servers)
+    ready_queue.put(dict(state.stats))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI/ElevenLabs/Suno 스텁 서버")
+    for key, value in DEFAULT_CONFIG.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args(argv)
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+
+    urls, state, servers = start_stub_servers(config)
+    print("스텁 서버 실행 중 (Ctrl+C로 종료):")
+    print(f"  OPENAI_API_BASE={urls['openai']}/v1")
+    print(f"  ELEVENLABS_BASE_URL={urls['elevenlabs']}")
+    print(f"  SUNO_BASE_URL={urls['suno']}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_stub_servers(servers)
+        print(json.dumps(state.stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
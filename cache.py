@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import tracing
+from storage import atomic_write, evict_lru
+
+# 편지, 가사, TTS 오디오, 노래 결과를 입력 해시로 저장하는 캐시입니다.
+# 텍스트 결과는 메모리 LRU + 디스크 JSON 파일에, 오디오는 디스크의 오디오 파일로 보관합니다.
+
+CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") != "0"
+CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(".cache", "results"))
+CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "256"))
+CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1GB
+
+
+def make_key(kind, **params):
+    """
+    프롬프트, 모델, 파라미터, voice_id 등을 정규화된 JSON으로 묶어 SHA-256 키를 만듭니다.
+    :param kind: 결과 종류 ("letter", "lyrics", "tts", "song" 등)
+    :return: 16진수 해시 문자열
+    """
+    raw = json.dumps({"kind": kind, **params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _size_or_zero(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _link_or_copy(src, dst):
+    # 결과 파일은 항상 임시 파일 + 이름 바꾸기로 교체되므로(제자리 덮어쓰기 없음) 하드 링크를 공유해도 안전합니다.
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+    """
+    메모리 LRU 계층과 크기 제한이 있는 디스크 계층으로 이루어진 결과 캐시입니다.
+    """
+
+    def __init__(self, root=CACHE_DIR, memory_items=CACHE_MEMORY_ITEMS, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.low_water_bytes = int(max_bytes * 0.9)  # 한도를 넘으면 이 크기까지 비웁니다
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._bytes = None  # 디스크 사용량 누적 합계 (첫 쓰기 때 디렉터리를 훑어 초기화)
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _path(self, key, suffix):
+        # 디렉터리 하나에 파일이 몰리지 않도록 키 앞 두 글자로 샤딩합니다.
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+        tracing.add(f"cache_{name}")  # 현재 span에도 캐시 적중/미스를 기록합니다
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        JSON 직렬화 가능한 결과를 조회합니다.
+        :return: 저장된 값 또는 None
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                tracing.add("cache_memory_hits")
+                return self._memory[key]
+
+        path = self._path(key, ".json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+        os.utime(path)  # LRU 정리를 위해 접근 시각을 갱신합니다
+        self._remember(key, value)
+        self._count("disk_hits")
+        return value
+
+    def set(self, key, value):
+        """
+        JSON 직렬화 가능한 결과를 메모리와 디스크에 저장합니다.
+        """
+        self._remember(key, value)
+        path = self._path(key, ".json")
+        with atomic_write(path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            nbytes = os.path.getsize(tmp_path) - _size_or_zero(path)
+        self._count("writes")
+        self._added(nbytes)
+
+    def get_file(self, key, suffix=".mp3"):
+        """
+        캐시된 오디오 파일 경로를 조회합니다.
+        :return: 캐시 내 파일 경로 또는 None
+        """
+        path = self._path(key, suffix)
+        if not os.path.exists(path):
+            self._count("misses")
+            return None
+        os.utime(path)
+        self._count("disk_hits")
+        return path
+
+    def put_file(self, key, src_path, suffix=".mp3"):
+        """
+        오디오 파일을 캐시 디렉터리에 보관합니다 (같은 파일 시스템이면 복사 대신 하드 링크).
+        :param src_path: 저장할 원본 파일 경로
+        :return: 캐시 내 파일 경로
+        """
+        path = self._path(key, suffix)
+        with atomic_write(path) as tmp_path:
+            _link_or_copy(src_path, tmp_path)
+            nbytes = os.path.getsize(tmp_path) - _size_or_zero(path)
+        self._count("writes")
+        self._added(nbytes)
+        return path
+
+    def restore_file(self, key, output_file, suffix=".mp3"):
+        """
+        캐시된 오디오 파일이 있으면 output_file로 복사합니다 (같은 파일 시스템이면 하드 링크).
+        :return: output_file 또는 None (캐시 미스)
+        """
+        path = self.get_file(key, suffix)
+        if path is None:
+            return None
+        if os.path.abspath(path) != os.path.abspath(output_file):
+            # 같은 경로를 읽는 쪽에 복사 중인 파일이 보이지 않도록 임시 파일로 복사한 뒤 교체합니다.
+            with atomic_write(output_file) as tmp_path:
+                _link_or_copy(path, tmp_path)
+        return output_file
+
+    def _added(self, nbytes):
+        # 디스크 사용량을 누적 합계로 추적하고, 한도를 넘었을 때만 디렉터리 전체를 훑어 정리합니다.
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += nbytes
+            due = self._bytes is None or self._bytes > self.max_bytes
+        if due and self._sweep_lock.acquire(blocking=False):
+            try:
+                self._sweep()
+            finally:
+                self._sweep_lock.release()
+
+    def _sweep(self):
+        total, evicted = evict_lru(self.root, self.max_bytes, self.low_water_bytes)
+        with self._lock:
+            for path, _ in evicted:
+                self._memory.pop(os.path.basename(path).split(".", 1)[0], None)
+            self._counters["evictions"] += len(evicted)
+            self._bytes = total
+
+    def stats(self):
+        """
+        적중/미스/저장/정리 횟수를 반환합니다.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_items"] = len(self._memory)
+            counters["disk_bytes"] = self._bytes or 0
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        counters["hit_rate"] = (counters["memory_hits"] + counters["disk_hits"]) / lookups if lookups else 0.0
+        return counters
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._bytes = None
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+# 프로세스 전체에서 공유하는 기본 캐시
+result_cache = ResultCache()
+tracing.register_gauges("result_cache", result_cache.stats)
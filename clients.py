@@ -0,0 +1,42 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+# 외부 API 클라이언트를 처음 사용할 때 만들고 재사용하는 팩토리입니다.
+# openai SDK는 가져오는 비용이 커서 모듈을 불러올 때가 아니라 실제로 필요할 때 import합니다.
+
+# 환경 변수 로드 (.env 파일 읽기만 하므로 가볍고, 다른 모듈의 설정값이 이를 참조하므로 가장 먼저 실행합니다)
+load_dotenv()
+
+_lock = threading.Lock()
+_instances = {}
+
+
+def _get_or_create(name, factory):
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            instance = factory()
+            _instances[name] = instance
+        return instance
+
+
+def get_openai():
+    """
+    API 키가 설정된 openai 모듈을 반환합니다 (openai 0.28 방식의 전역 클라이언트).
+    """
+    def create():
+        import openai
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        return openai
+
+    return _get_or_create("openai", create)
+
+
+def reset():
+    """
+    캐시된 클라이언트를 모두 버립니다 (API 키를 바꾼 뒤 다시 만들 때 사용).
+    """
+    with _lock:
+        _instances.clear()
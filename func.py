@@ -1,142 +1,311 @@
-import openai
-from elevenlabs import ElevenLabs, Voice, VoiceSettings
+from clients import get_openai
 import os
-from dotenv import load_dotenv
+import time
 import requests
-import streamlit as st
-from pydub import AudioSegment
-from io import BytesIO
+import http_client
+from storage import atomic_write
+from artifacts import artifact_store
+from cache import make_key, result_cache, CACHE_ENABLED
+from tts_chunker import chunk_text, concat_mp3
+from locks import striped_lock
+from rate_limit import estimate_tokens, get_limiter
+from voice_catalog import voice_catalog
+import tracing
+from tracing import traced
+import itertools
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # 참고한 API docs
 # https://www.postman.com/winter-capsule-627402/luma-api/documentation/n6uwn9m/suno?entity=request-3856400-846e4240-057f-4141-a7d6-639770d4a387
 
-# 환경 변수 로드
-load_dotenv()
+# 환경 변수는 clients 모듈을 불러올 때 로드됩니다.
+# openai/pydub/streamlit은 무거우므로 실제로 사용하는 함수 안에서 가져옵니다.
 
 # ElevenLabs API 키 설정
 elevenlabs_api_key = os.getenv('ELEVENLABS_API_KEY')
-openai.api_key = os.getenv("OPENAI_API_KEY")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
 # Suno API 키 설정
 suno_api_key = os.getenv('SUNO_API_KEY')
 
-# ElevenLabs 클라이언트 초기화
-client = ElevenLabs(api_key=elevenlabs_api_key)
+# 생성 실패 시 편지/가사 대신 반환되는 안내 문구
+ERROR_MESSAGE = "오류가 발생했습니다. 다시 시도해주세요."
 
+# 긴 텍스트 TTS 분할 설정
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "500"))
+TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", "4"))
+
+@traced()
 def list_available_voices():
     """
     사용 가능한 음성을 나열하고, 사용자가 선택할 수 있도록 반환합니다.
+    목록은 voice_catalog에 캐시되므로 매번 API를 호출하지 않습니다.
+    :return: 음성 정보 dict 리스트
     """
-    available_voices = client.voices.get_all()
+    available_voices = voice_catalog.voices()
     print("\nAvailable Voices:")
-    for idx, voice in enumerate(available_voices.voices):
-        print(f"{idx + 1}. {voice.name} (ID: {voice.voice_id})")
+    for idx, voice in enumerate(available_voices):
+        print(f"{idx + 1}. {voice['name']} (ID: {voice['voice_id']})")
     return available_voices
 
+@traced()
 def get_voice_id_by_gender(gender):
     """
     성별에 따라 적절한 음성 ID를 반환합니다.
+    카탈로그에 실제로 있는 ID만 반환하며, 알 수 없는 성별은 기본 성별(여성)로 처리합니다.
+    """
+    return voice_catalog.select_voice(gender)
+
+def _tts_payload(text, previous_text=None, next_text=None):
+    # ElevenLabs TTS 요청 본문 (일반/스트리밍 공통)
+    payload = {
+        "text": text,
+        "model_id": "eleven_multilingual_v2",  # 다국어 지원 모델 사용
+        "voice_settings": {
+            "stability": 0.75,
+            "similarity_boost": 0.85
+        }
+    }
+    # 긴 텍스트를 나눠 합성할 때 앞뒤 문맥을 넘겨 억양이 자연스럽게 이어지도록 합니다.
+    if previous_text:
+        payload["previous_text"] = previous_text
+    if next_text:
+        payload["next_text"] = next_text
+    return payload
+
+@traced()
+def stream_text_to_speech(text, voice_id, chunk_size=4096, stats=None, previous_text=None, next_text=None):
+    """
+    ElevenLabs 스트리밍 엔드포인트로 텍스트를 음성으로 변환하고,
+    오디오 바이트 청크를 도착하는 대로 내보내는 제너레이터입니다.
+    :param text: 변환할 텍스트
+    :param voice_id: 사용할 음성 ID
+    :param chunk_size: 한 번에 읽을 바이트 수
+    :param stats: dict를 넘기면 'ttfb', 'total_time', 'bytes' 값이 채워집니다
+    :param previous_text: 앞 조각의 텍스트 (억양 연결용)
+    :param next_text: 뒤 조각의 텍스트 (억양 연결용)
+    :return: 오디오 바이트 청크 제너레이터
     """
-    # 성별별 음성 ID 매핑
-    voice_mapping = {
-        "여성": "Xb7hH8MSUJpSbSDYk0k2",  # 실제 여성 음성 ID로 교체
-        "남성": "JBFqnCBsd6RMkjVDRZzb",  # 실제 남성 음성 ID로 교체
+    url = f"{ELEVENLABS_BASE_URL}/v1/text-to-speech/{voice_id}/stream"
+    headers = {
+        "xi-api-key": elevenlabs_api_key,
+        "Content-Type": "application/json"
     }
-    return voice_mapping.get(gender, "voice_id_for_default")  # 기본 음성 ID
+    # 응답 본문을 다 받을 때까지 ElevenLabs 동시 요청 자리를 차지합니다.
+    with get_limiter("elevenlabs").slot():
+        start = time.perf_counter()
+        response = http_client.post(url, headers=headers, json=_tts_payload(text, previous_text, next_text), stream=True)
+        try:
+            if not response.ok:
+                response.content  # 오류 응답 본문을 닫기 전에 읽어 둡니다
+            response.raise_for_status()
+            total_bytes = 0
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                if total_bytes == 0 and stats is not None:
+                    stats["ttfb"] = time.perf_counter() - start
+                total_bytes += len(chunk)
+                yield chunk
+            if stats is not None:
+                stats["total_time"] = time.perf_counter() - start
+                stats["bytes"] = total_bytes
+        finally:
+            response.close()
+
+def tee_audio_stream(chunks, output_file):
+    """
+    오디오 청크를 파일에 기록하면서 그대로 다시 내보냅니다.
+    플레이어나 응답 스트림으로 전달하는 동안 파일도 함께 저장할 때 사용합니다.
+    :param chunks: 오디오 바이트 청크 이터러블
+    :param output_file: 저장할 오디오 파일 경로
+    :return: 오디오 바이트 청크 제너레이터
+    """
+    with open(output_file, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            yield chunk
+
+def _save_tts_stream(text, voice_id, output_file, stats, previous_text=None, next_text=None):
+    # 응답 전체를 메모리에 모으지 않고 청크 단위로 파일에 기록합니다.
+    try:
+        chunks = stream_text_to_speech(text, voice_id, stats=stats, previous_text=previous_text, next_text=next_text)
+        for _ in tee_audio_stream(chunks, output_file):
+            pass
+    except Exception:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
 
-def text_to_speech1(text, gender, output_file='output.mp3'):
+@traced()
+def synthesize_long_text(text, voice_id, output_file, stats=None, max_chars=TTS_CHUNK_CHARS, concurrency=TTS_CHUNK_CONCURRENCY):
+    """
+    긴 텍스트를 문장 단위 조각으로 나눠 동시에 합성한 뒤, 순서대로 이어 붙여 저장합니다.
+    전체 합성 시간이 편지 길이가 아니라 가장 긴 조각에 맞춰지도록 합니다.
+    :param text: 변환할 텍스트
+    :param voice_id: 사용할 음성 ID
+    :param output_file: 저장할 오디오 파일 경로
+    :param stats: dict를 넘기면 'ttfb'(첫 조각의 첫 바이트까지 걸린 시간), 'total_time', 'bytes'(전체 조각 합계) 값이 채워집니다
+    :param max_chars: 조각당 최대 글자 수
+    :param concurrency: 동시에 합성할 최대 조각 수
+    """
+    chunks = chunk_text(text, max_chars)
+    if len(chunks) <= 1:
+        # 다른 화면이 같은 경로를 읽고 있어도 완성된 파일만 보이도록 임시 파일에 쓴 뒤 교체합니다.
+        with atomic_write(output_file) as tmp_file:
+            _save_tts_stream(text, voice_id, tmp_file, stats if stats is not None else {})
+        return
+
+    part_files = [f"{output_file}.{index}.part" for index in range(len(chunks))]
+    part_stats = [{} for _ in chunks]
+    start = time.perf_counter()
+
+    def synthesize(index):
+        previous_text = chunks[index - 1] if index > 0 else None
+        next_text = chunks[index + 1] if index + 1 < len(chunks) else None
+        # 조각 요청이 시작되기까지의 대기 시간(동시 요청 제한 등)도 TTFB에 포함되도록 기록합니다.
+        part_stats[index]["offset"] = time.perf_counter() - start
+        _save_tts_stream(chunks[index], voice_id, part_files[index], part_stats[index], previous_text, next_text)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(tracing.propagate(synthesize), range(len(chunks))))
+        with atomic_write(output_file) as tmp_file:
+            concat_mp3(part_files, tmp_file)
+        if stats is not None:
+            # 재생은 첫 조각부터 시작하므로 첫 조각의 첫 바이트를 TTFB로 봅니다.
+            stats["ttfb"] = part_stats[0]["offset"] + part_stats[0].get("ttfb", 0.0)
+            stats["total_time"] = time.perf_counter() - start
+            stats["bytes"] = sum(part.get("bytes", 0) for part in part_stats)
+    finally:
+        for part in part_files:
+            if os.path.exists(part):
+                os.remove(part)
+
+@traced()
+def text_to_speech1(text, gender, output_file=None, use_cache=True):
     """
     텍스트를 성별에 따라 지정된 음성으로 변환하여 오디오 파일로 저장합니다.
 
     :param text: 변환할 텍스트
     :param gender: 성별 ("남성" 또는 "여성")
-    :param output_file: 저장할 오디오 파일명 (기본값: 'output.mp3')
+    :param output_file: 저장할 오디오 파일 경로 (기본값: 아티팩트 저장소의 새 임시 경로)
+    :param use_cache: False이면 캐시를 건너뛰고 새로 생성합니다
     :return: 생성된 오디오 파일 경로 또는 None
     """
     voice_id = get_voice_id_by_gender(gender)
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    headers = {
-        "xi-api-key": elevenlabs_api_key,
-        "Content-Type": "application/json"
-    }
-    data = {
-        "text": text,
-        "model_id": "eleven_multilingual_v2",  # 다국어 지원 모델 사용
-        "voice_settings": {
-            "stability": 0.75,
-            "similarity_boost": 0.85
-        }
-    }
+    cache_key = make_key("tts", voice_id=voice_id, **_tts_payload(text))
+    if output_file is None:
+        output_file = artifact_store.scratch_path(".mp3")
+    if use_cache and CACHE_ENABLED and result_cache.restore_file(cache_key, output_file):
+        return output_file
+    stats = {}
     try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        with open(output_file, 'wb') as f:
-            f.write(response.content)
-        print(f"음성 파일이 '{output_file}'로 저장되었습니다.")
+        synthesize_long_text(text, voice_id, output_file, stats)
+        if use_cache and CACHE_ENABLED:
+            result_cache.put_file(cache_key, output_file)
+        print(f"음성 파일이 '{output_file}'로 저장되었습니다. (TTFB: {stats.get('ttfb', 0):.2f}초)")
         return output_file
     except requests.exceptions.RequestException as e:
-        print(f"음성 변환 중 오류 발생: {e}\n응답 내용: {response.text}")
+        tracing.record_error(e)
+        response_text = e.response.text if e.response is not None else ""
+        print(f"음성 변환 중 오류 발생: {e}\n응답 내용: {response_text}")
+        return None
+    except OSError as e:
+        tracing.record_error(e)
+        print(f"음성 파일 저장 중 오류 발생: {e}")
         return None
 
 
-
-
-def upload_user_voice(file_path):
+@traced()
+def upload_user_voice(source, name="MelodyGram user voice"):
     """
     사용자 목소리를 업로드하고 ElevenLabs에서 사용자 스타일을 등록합니다.
-    :param file_path: 사용자의 음성 파일 경로 (예: .wav 형식)
+    파일 내용을 메모리에 한꺼번에 올리지 않고 multipart 본문으로 조금씩 읽어 보냅니다.
+    :param source: 사용자의 음성 파일 경로 (예: .wav 형식) 또는 읽기 가능한 파일 객체 (예: Streamlit 업로드 파일)
+    :param name: ElevenLabs에 등록할 음성 이름
     :return: 등록된 음성 프로필 ID 또는 None
     """
-    url = "https://api.elevenlabs.io/v1/voices/add"
+    url = f"{ELEVENLABS_BASE_URL}/v1/voices/add"
+
+    def post(fileobj, filename):
+        body = http_client.MultipartStream({"name": name}, "voice", fileobj, filename)
+        headers = {
+            "xi-api-key": elevenlabs_api_key,
+            "Content-Type": body.content_type
+        }
+        with get_limiter("elevenlabs").slot():
+            response = http_client.post(url, headers=headers, data=body, idempotent=False)
+        response.raise_for_status()
+        return response.json().get("voice_id")
+
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                return post(f, os.path.basename(source))
+        return post(source, os.path.basename(getattr(source, "name", "voice.wav")))
+    except requests.exceptions.RequestException as e:
+        tracing.record_error(e)
+        print(f"사용자 목소리 업로드 중 오류 발생: {e}")
+        return None
+
+@traced()
+def delete_user_voice(voice_id):
+    """
+    ElevenLabs에 등록된 사용자 목소리를 삭제합니다.
+    :param voice_id: 삭제할 음성 ID
+    :return: 성공 여부
+    """
+    url = f"{ELEVENLABS_BASE_URL}/v1/voices/{voice_id}"
     headers = {
         "xi-api-key": elevenlabs_api_key
     }
-    files = {
-        "voice": open(file_path, "rb")
-    }
     try:
-        response = requests.post(url, headers=headers, files=files)
-        response.raise_for_status()
-        voice_id = response.json().get("voice_id")
-        return voice_id
+        with get_limiter("elevenlabs").slot():
+            response = http_client.delete(url, headers=headers)
+        # 이미 삭제된 음성은 성공으로 봅니다.
+        if response.status_code != 404:
+            response.raise_for_status()
+        return True
     except requests.exceptions.RequestException as e:
-        print(f"사용자 목소리 업로드 중 오류 발생: {e}")
-        return None
+        tracing.record_error(e)
+        print(f"사용자 목소리 삭제 중 오류 발생: {e}")
+        return False
 
-def text_to_speech_with_user_voice(text, voice_id, output_file='output_user_voice.mp3'):
+@traced()
+def text_to_speech_with_user_voice(text, voice_id, output_file=None, use_cache=True):
     """
     사용자의 목소리 스타일을 적용하여 텍스트를 음성으로 변환합니다.
     :param text: 변환할 텍스트
     :param voice_id: 등록된 사용자 목소리 프로필 ID
-    :param output_file: 저장할 오디오 파일명 (기본값: 'output_user_voice.mp3')
+    :param output_file: 저장할 오디오 파일 경로 (기본값: 아티팩트 저장소의 새 임시 경로)
+    :param use_cache: False이면 캐시를 건너뛰고 새로 생성합니다
     :return: 생성된 오디오 파일 경로 또는 None
     """
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    headers = {
-        "xi-api-key": elevenlabs_api_key,
-        "Content-Type": "application/json"
-    }
-    data = {
-        "text": text,
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {
-            "stability": 0.75,
-            "similarity_boost": 0.85
-        }
-    }
+    cache_key = make_key("tts", voice_id=voice_id, **_tts_payload(text))
+    if output_file is None:
+        output_file = artifact_store.scratch_path(".mp3")
+    if use_cache and CACHE_ENABLED and result_cache.restore_file(cache_key, output_file):
+        return output_file
     try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        with open(output_file, 'wb') as f:
-            f.write(response.content)
+        synthesize_long_text(text, voice_id, output_file)
+        if use_cache and CACHE_ENABLED:
+            result_cache.put_file(cache_key, output_file)
         return output_file
     except requests.exceptions.RequestException as e:
+        tracing.record_error(e)
         print(f"사용자 목소리 스타일 변환 중 오류 발생: {e}")
         return None
+    except OSError as e:
+        tracing.record_error(e)
+        print(f"음성 파일 저장 중 오류 발생: {e}")
+        return None
 
-def generate_letter(recipient, appreciation, min_wc):
-    """
-    사용자 입력을 기반으로 진심 어린 감사 편지를 생성합니다.
-    """
+def _letter_request(recipient, appreciation, min_wc):
+    # 편지 생성 요청 (일반/스트리밍 공통)
     prompt = (
         f"'{recipient}'에게 드릴 감사 편지를 작성해주세요. "
         f"감사의 이유는 다음과 같습니다: '{appreciation}'. "
@@ -148,161 +317,627 @@ def generate_letter(recipient, appreciation, min_wc):
         f"편지는 최소 {min_wc}자에서 {min_wc+10}자 사이로 구성되며, 자연스럽고 감동적인 언어로 작성해주세요."
         
     )
+    return dict(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "당신은 감동적인 편지를 작성하는 전문가입니다."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=500,  # 충분한 길이를 보장
+        temperature=0.7
+    )
+
+# 가사 프롬프트 템플릿
+# 장르와 무관한 앞부분(시스템 메시지 + 받는 분/감사 내용/편지 요약 + 가사 구성)을 장르별 요청과
+# 가사/제목+가사 요청이 바이트 단위로 똑같이 공유하므로, 장르를 바꿔 다시 요청해도 제공자 측 프롬프트 접두사 캐시가 적용됩니다.
+# 장르마다 달라지는 지시는 반드시 마지막(LYRICS_GENRE_TEMPLATE 이후)에만 붙여야 합니다.
+LYRICS_SYSTEM_PROMPT = "당신은 전문적인 노래 가사를 작성하는 도우미입니다."
+LYRICS_CONTEXT_TEMPLATE = (
+    "받는 분: {recipient}\n"
+    "감사 내용: {appreciation}\n"
+    "편지 내용: {letter}\n\n"
+    "위 내용을 바탕으로 받는 분께 감사의 마음을 전하는 한국 노래 가사를 작성해주세요.\n"
+    "가사는 아래 형식을 따르며, 끊김 없이 자연스럽게 작성해주세요:\n"
+    "- Verse 1: 받는 분과의 관계를 소개하고 감사의 마음을 표현 (30~40 단어).\n"
+    "- Chorus: 받는 분의 사랑과 조언이 삶에 미친 영향을 강조하며, 반복적이고 감동적인 메시지 (20~30 단어).\n"
+    "- Verse 2: 받는 분과의 구체적인 추억을 기반으로 더 깊은 감정과 스토리를 전개 (30~40 단어).\n"
+    "- Bridge: 감정을 최고조로 끌어올리며, 받는 분께 드리는 소망과 사랑의 메시지 (20~30 단어).\n"
+    "- Chorus 반복: 동일한 후렴 반복.\n\n"
+)
+LYRICS_GENRE_TEMPLATE = "'{genre}' 스타일로 가사를 자연스럽고 세련되게 작성해주세요. 자연스럽게 영단어를 중간에 넣어도 좋습니다."
+TITLE_FORMAT_INSTRUCTION = (
+    "\n\n노래 제목도 함께 지어 다음 형식으로 출력해주세요:\n\n"
+    "title: -\n"
+    "lyrics: -\n\n"
+    "예를 들어:\n\n"
+    "title: 당신에게 바치는 노래\n"
+    "lyrics: [Verse 1]\n"
+    "당신과 함께한 시간들...\n"
+)
+
+# 편지 요약 설정: 이 길이 이상인 편지만 요약해서 가사 프롬프트에 넣습니다.
+LETTER_SUMMARY_MIN_CHARS = int(os.getenv("LETTER_SUMMARY_MIN_CHARS", "600"))
+LETTER_SUMMARY_MAX_TOKENS = int(os.getenv("LETTER_SUMMARY_MAX_TOKENS", "200"))
+LETTER_SUMMARY_MODEL = os.getenv("LETTER_SUMMARY_MODEL", "gpt-4")
+
+_summary_locks = [threading.Lock() for _ in range(32)]  # 편지별 요약 잠금 (striped_lock 참고)
+# RESULT_CACHE_ENABLED=0일 때 쓰는 프로세스 내 요약 메모 (여러 장르가 같은 편지를 중복 요약하지 않도록)
+_SUMMARY_MEMO_ITEMS = 64
+_summary_memo = OrderedDict()
+_summary_memo_lock = threading.Lock()
+
+def _lyrics_messages(recipient, appreciation, letter_context, genre, with_title=False):
+    # 장르와 무관한 접두사 뒤에 장르(와 출력 형식) 지시만 덧붙입니다.
+    prompt = LYRICS_CONTEXT_TEMPLATE.format(recipient=recipient, appreciation=appreciation, letter=letter_context)
+    prompt += LYRICS_GENRE_TEMPLATE.format(genre=genre)
+    if with_title:
+        prompt += TITLE_FORMAT_INSTRUCTION
+    return [
+        {"role": "system", "content": LYRICS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def _lyrics_request(recipient, appreciation, letter_context, genre):
+    # 가사 생성 요청 (일반/스트리밍 공통). letter_context는 summarize_letter()의 결과입니다.
+    return dict(
+        model="gpt-4",
+        messages=_lyrics_messages(recipient, appreciation, letter_context, genre),
+        max_tokens=700,  # 충분한 길이 확보
+        temperature=0.7
+    )
+
+def _lyrics_and_title_request(recipient, appreciation, letter_context, genre):
+    # 제목+가사 생성 요청 (일반/스트리밍 공통). letter_context는 summarize_letter()의 결과입니다.
+    return dict(
+        model="gpt-4",
+        messages=_lyrics_messages(recipient, appreciation, letter_context, genre, with_title=True),
+        max_tokens=700,  # 충분한 길이 확보
+        temperature=0.7
+    )
+
+def _letter_summary_request(letter):
+    # 가사 프롬프트에 넣을 편지 요약 요청 (같은 편지면 항상 같은 결과가 나오도록 temperature 0)
+    prompt = (
+        "다음 편지를 노래 가사의 재료로 쓸 수 있게 요약해주세요. "
+        "받는 분과의 관계, 감사한 이유, 구체적인 추억, 전하고 싶은 소망을 빠짐없이 담아 "
+        "3~5개의 짧은 문장으로 작성해주세요.\n\n"
+        f"편지 내용: {letter}"
+    )
+    return dict(
+        model=LETTER_SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": "당신은 글의 핵심을 정확하게 요약하는 도우미입니다."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=LETTER_SUMMARY_MAX_TOKENS,
+        temperature=0
+    )
+
+@traced()
+def summarize_letter(letter):
+    """
+    가사 프롬프트에 넣을 편지 요약을 반환합니다.
+    LETTER_SUMMARY_MIN_CHARS보다 짧은 편지나 요약에 실패한 경우에는 편지를 그대로 반환합니다.
+    요약은 편지 내용으로 캐시되므로 장르를 바꿔 가사를 다시 만들 때는 API를 호출하지 않습니다.
+    RESULT_CACHE_ENABLED=0이면 디스크 캐시 대신 이 프로세스 안에서만 기억합니다.
+    :param letter: 생성된 편지
+    :return: 가사 프롬프트에 넣을 편지 내용
+    """
+    if not letter or len(letter) < LETTER_SUMMARY_MIN_CHARS:
+        return letter
+    request = _letter_summary_request(letter)
+    cache_key = make_key("letter_summary", **request)
+
+    # 여러 장르의 가사를 동시에 만들 때 같은 편지를 중복 요약하지 않도록 편지별로 잠급니다.
+    with striped_lock(cache_key, _summary_locks):
+        cached = _get_summary(cache_key)
+        if cached is not None:
+            return cached
+        try:
+            response = _chat_completion(request)
+            summary = response.choices[0].message.content.strip()
+        except Exception as e:
+            tracing.record_error(e)
+            print(f"편지 요약 중 오류 발생: {e}")
+            return letter
+        _set_summary(cache_key, summary)
+        return summary
+
+def _get_summary(cache_key):
+    # RESULT_CACHE_ENABLED=0이면 디스크 캐시 대신 프로세스 내 메모에서 찾습니다.
+    if CACHE_ENABLED:
+        return result_cache.get(cache_key)
+    with _summary_memo_lock:
+        if cache_key in _summary_memo:
+            _summary_memo.move_to_end(cache_key)
+        return _summary_memo.get(cache_key)
+
+def _set_summary(cache_key, summary):
+    if CACHE_ENABLED:
+        result_cache.set(cache_key, summary)
+        return
+    with _summary_memo_lock:
+        _summary_memo[cache_key] = summary
+        while len(_summary_memo) > _SUMMARY_MEMO_ITEMS:
+            _summary_memo.popitem(last=False)
+
+@traced()
+def _chat_completion(request):
+    # OpenAI 속도 제한(RPM/TPM/동시 요청)을 지키며 ChatCompletion을 호출합니다.
+    with get_limiter("openai").slot(estimate_tokens(request["messages"], request["max_tokens"])):
+        response = get_openai().ChatCompletion.create(**request)
+    # 실제 프롬프트 토큰 수를 span에 남겨 프롬프트 압축 효과를 확인할 수 있게 합니다.
+    usage = response.get("usage") or {}
+    tracing.add("prompt_tokens", usage.get("prompt_tokens", 0))
+    tracing.add("completion_tokens", usage.get("completion_tokens", 0))
+    return response
+
+@traced()
+def _stream_chat(request):
+    # ChatCompletion 스트리밍 응답에서 텍스트 조각만 꺼내 내보냅니다.
+    # 스트림이 끝날 때까지 OpenAI 동시 요청 자리를 차지합니다.
+    with get_limiter("openai").slot(estimate_tokens(request["messages"], request["max_tokens"])):
+        for chunk in get_openai().ChatCompletion.create(stream=True, **request):
+            delta = chunk.choices[0].delta.get("content")
+            if delta:
+                yield delta
+
+def _parse_title_lyrics(content):
+    # 'title: '과 'lyrics: '로 시작하는 부분을 추출
+    title = None
+    lyrics = None
+    if content.startswith('title:'):
+        parts = content.split('lyrics:', 1)
+        if len(parts) == 2:
+            title = parts[0].replace('title:', '').strip()
+            lyrics = parts[1].strip()
+
+    if title is None or lyrics is None:
+        raise ValueError("응답에서 제목 또는 가사를 추출하지 못했습니다.")
+    return title, lyrics
+
+class TitleLyricsParser:
+    """
+    'title: ... lyrics: ...' 형식의 스트리밍 응답을 조각 단위로 해석합니다.
+    제목이 완성되는 즉시 ("title", 제목)을, 이후에는 가사 조각을 ("lyrics", 조각)으로 내보냅니다.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.title = None
+        self.lyrics = ""
+        self._in_lyrics = False
+
+    def feed(self, delta):
+        """
+        :param delta: 새로 도착한 텍스트 조각
+        :return: 새로 확정된 (종류, 값) 이벤트 리스트
+        """
+        if self._in_lyrics:
+            return self._emit_lyrics(delta)
+
+        self.buffer += delta
+        events = []
+        text = self.buffer.lstrip()
+        if self.title is None and text.startswith("title:"):
+            # 줄바꿈이나 'lyrics:'가 나오면 제목이 완성된 것으로 봅니다.
+            body = text[len("title:"):]
+            end = min(pos for pos in (body.find("\n"), body.find("lyrics:"), len(body)) if pos >= 0)
+            if end < len(body):
+                self.title = body[:end].strip()
+                events.append(("title", self.title))
+        if "lyrics:" in self.buffer:
+            self._in_lyrics = True
+            remainder = self.buffer.split("lyrics:", 1)[1].lstrip()
+            if self.title is None:
+                self.title = self.buffer.split("lyrics:", 1)[0].replace("title:", "").strip()
+                events.append(("title", self.title))
+            events.extend(self._emit_lyrics(remainder))
+        return events
+
+    def _emit_lyrics(self, delta):
+        if not self.lyrics:
+            delta = delta.lstrip()
+        if not delta:
+            return []
+        self.lyrics += delta
+        return [("lyrics", delta)]
+
+    def close(self):
+        """
+        스트림이 끝났을 때 호출합니다. 제목이나 가사를 찾지 못했으면 ValueError를 냅니다.
+        :return: (제목, 가사)
+        """
+        if self.title is None or not self._in_lyrics:
+            raise ValueError("응답에서 제목 또는 가사를 추출하지 못했습니다.")
+        return self.title, self.lyrics.strip()
+
+@traced()
+def generate_letter(recipient, appreciation, min_wc, use_cache=True):
+    """
+    사용자 입력을 기반으로 진심 어린 감사 편지를 생성합니다.
+    :param use_cache: False이면 캐시를 건너뛰고 새로 샘플링합니다
+    """
+    request = _letter_request(recipient, appreciation, min_wc)
+    cache_key = make_key("letter", **request)
+    if use_cache and CACHE_ENABLED:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "당신은 감동적인 편지를 작성하는 전문가입니다."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,  # 충분한 길이를 보장
-            temperature=0.7
-        )
+        response = _chat_completion(request)
 
-        return response.choices[0].message.content.strip()
+        letter = response.choices[0].message.content.strip()
+        if use_cache and CACHE_ENABLED:
+            result_cache.set(cache_key, letter)
+        return letter
         
     except Exception as e:
+        tracing.record_error(e)
         print(f"편지 생성 중 오류 발생: {e}")
-        return "오류가 발생했습니다. 다시 시도해주세요."
+        return ERROR_MESSAGE
 
-def generate_lyrics(recipient, appreciation, letter, genre):
+@traced()
+def stream_letter(recipient, appreciation, min_wc, use_cache=True):
+    """
+    generate_letter의 스트리밍 버전입니다. 편지 텍스트 조각을 도착하는 대로 내보냅니다.
+    오류는 예외로 전달됩니다.
+    :return: 텍스트 조각 제너레이터
+    """
+    request = _letter_request(recipient, appreciation, min_wc)
+    cache_key = make_key("letter", **request)
+    if use_cache and CACHE_ENABLED:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    content = ""
+    for delta in _stream_chat(request):
+        content += delta
+        yield delta
+    if use_cache and CACHE_ENABLED:
+        result_cache.set(cache_key, content.strip())
+
+@traced()
+def generate_lyrics(recipient, appreciation, letter, genre, use_cache=True):
     """
     사용자 입력과 생성된 편지를 기반으로 노래 가사를 생성합니다.
     :param recipient: 감사의 대상
     :param appreciation: 감사 내용
     :param genre: 노래 장르
+    :param use_cache: False이면 캐시를 건너뛰고 새로 샘플링합니다
     """
-    prompt = (
-        f"'{recipient}'에게 전하는 감사의 마음과 '{appreciation}'을(를) 주제로 한 한국 노래 가사를 작성해주세요.\n"
-        f"다음의 편지 내용을 참고하세요. 편지 내용: '{letter}'"
-        f"가사는 아래 형식을 따르며, 끊김 없이 자연스럽게 작성해주세요:\n\n"
-        f"- Verse 1: '{recipient}'와의 관계를 소개하고 감사의 마음을 시작으로 표현 (30~40 단어).\n"
-        f"- Chorus: '{recipient}'의 사랑과 조언이 삶에 미친 영향을 강조하며 반복적이고 감동적인 메시지 (20~30 단어).\n"
-        f"- Verse 2: '{recipient}'와의 구체적인 추억을 기반으로 더 깊은 감정과 스토리를 전개 (30~40 단어).\n"
-        f"- Bridge: 감정을 최고조로 끌어올리며, '{recipient}'께 드리는 소망과 사랑의 메시지 (20~30 단어).\n"
-        f"- Chorus 반복: 동일한 후렴 반복.\n\n"
-        f"입력된 감사 내용: '{appreciation}'\n\n"
-        f"'{genre}' 스타일로 가사를 자연스럽고 세련되게 작성해주세요. 자연스럽게 영단어를 중간에 넣어도 좋습니다."
-    )
-
+    request = _lyrics_request(recipient, appreciation, summarize_letter(letter), genre)
+    cache_key = make_key("lyrics", **request)
+    if use_cache and CACHE_ENABLED:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "당신은 전문적인 노래 가사를 작성하는 도우미입니다."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=700,  # 충분한 길이 확보
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
+        response = _chat_completion(request)
+        lyrics = response.choices[0].message.content.strip()
+        if use_cache and CACHE_ENABLED:
+            result_cache.set(cache_key, lyrics)
+        return lyrics
 
     except Exception as e:
+        tracing.record_error(e)
         print(f"가사 생성 중 오류 발생: {e}")
-        return "오류가 발생했습니다. 다시 시도해주세요."
+        return ERROR_MESSAGE
+
+@traced()
+def stream_lyrics(recipient, appreciation, letter, genre, use_cache=True):
+    """
+    generate_lyrics의 스트리밍 버전입니다. 가사 텍스트 조각을 도착하는 대로 내보냅니다.
+    오류는 예외로 전달됩니다.
+    :return: 텍스트 조각 제너레이터
+    """
+    request = _lyrics_request(recipient, appreciation, summarize_letter(letter), genre)
+    cache_key = make_key("lyrics", **request)
+    if use_cache and CACHE_ENABLED:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    content = ""
+    for delta in _stream_chat(request):
+        content += delta
+        yield delta
+    if use_cache and CACHE_ENABLED:
+        result_cache.set(cache_key, content.strip())
     
-def generate_lyrics_and_title(recipient, appreciation, letter, genre):
+@traced()
+def generate_lyrics_and_title(recipient, appreciation, letter, genre, use_cache=True):
     """
     사용자 입력과 생성된 편지를 기반으로 노래 제목과 가사를 생성합니다.
     :param recipient: 감사의 대상
     :param appreciation: 감사 내용
     :param letter: 사용자 편지 내용
     :param genre: 노래 장르
+    :param use_cache: False이면 캐시를 건너뛰고 새로 샘플링합니다
     :return: 생성된 노래 제목과 가사
     """
-    prompt = (
-        f"'{recipient}'에게 전하는 감사의 마음과 '{appreciation}'을(를) 주제로 한 한국 노래 제목과 가사를 작성해주세요.\n"
-        f"다음의 편지 내용을 참고하세요:\n\n"
-        f"편지 내용: '{letter}'\n\n"
-        f"가사는 아래 형식을 따르며, 끊김 없이 자연스럽게 작성해주세요:\n\n"
-        f"- Verse 1: '{recipient}'와의 관계를 소개하고 감사의 마음을 표현 (30~40 단어).\n"
-        f"- Chorus: '{recipient}'의 사랑과 조언이 삶에 미친 영향을 강조하며, 반복적이고 감동적인 메시지 (20~30 단어).\n"
-        f"- Verse 2: '{recipient}'와의 구체적인 추억을 기반으로 더 깊은 감정과 스토리를 전개 (30~40 단어).\n"
-        f"- Bridge: 감정을 최고조로 끌어올리며, '{recipient}'께 드리는 소망과 사랑의 메시지 (20~30 단어).\n"
-        f"- Chorus 반복: 동일한 후렴 반복.\n\n"
-        f"'{genre}' 스타일로 가사를 자연스럽고 세련되게 작성해주세요. 자연스럽게 영단어를 중간에 넣어도 좋습니다.\n\n"
-        f"출력 형식은 다음과 같이 해주세요:\n\n"
-        f"title: -\n"
-        f"lyrics: -\n\n"
-        f"예를 들어:\n\n"
-        f"title: 당신에게 바치는 노래\n"
-        f"lyrics: [Verse 1]\n"
-        f"당신과 함께한 시간들...\n"
-    )
-
+    request = _lyrics_and_title_request(recipient, appreciation, summarize_letter(letter), genre)
+    cache_key = make_key("lyrics_and_title", **request)
+    if use_cache and CACHE_ENABLED:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return tuple(cached)
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "당신은 전문적인 노래 가사를 작성하는 도우미입니다."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=700,  # 충분한 길이 확보
-            temperature=0.7
-        )
+        response = _chat_completion(request)
         content = response.choices[0].message.content.strip()
-        
-        # 'title: '과 'lyrics: '로 시작하는 부분을 추출
-        title = None
-        lyrics = None
-        if content.startswith('title:'):
-            parts = content.split('lyrics:', 1)
-            if len(parts) == 2:
-                title = parts[0].replace('title:', '').strip()
-                lyrics = parts[1].strip()
-        
-        if title is None or lyrics is None:
-            raise ValueError("응답에서 제목 또는 가사를 추출하지 못했습니다.")
-        
+        title, lyrics = _parse_title_lyrics(content)
+        if use_cache and CACHE_ENABLED:
+            result_cache.set(cache_key, [title, lyrics])
         return title, lyrics
 
     except Exception as e:
+        tracing.record_error(e)
         print(f"가사 및 제목 생성 중 오류 발생: {e}")
-        return "오류가 발생했습니다. 다시 시도해주세요.", ""
-    
+        return ERROR_MESSAGE, ""
 
+@traced()
+def stream_lyrics_and_title(recipient, appreciation, letter, genre, use_cache=True):
+    """
+    generate_lyrics_and_title의 스트리밍 버전입니다.
+    제목이 완성되면 ("title", 제목)을 먼저 내보내고, 이어서 ("lyrics", 가사 조각)을 도착하는 대로 내보냅니다.
+    오류는 예외로 전달됩니다.
+    :return: (종류, 값) 이벤트 제너레이터
+    """
+    request = _lyrics_and_title_request(recipient, appreciation, summarize_letter(letter), genre)
+    cache_key = make_key("lyrics_and_title", **request)
+    if use_cache and CACHE_ENABLED:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            yield "title", cached[0]
+            yield "lyrics", cached[1]
+            return
+    parser = TitleLyricsParser()
+    for delta in _stream_chat(request):
+        yield from parser.feed(delta)
+    title, lyrics = parser.close()
+    if use_cache and CACHE_ENABLED:
+        result_cache.set(cache_key, [title, lyrics])
 
+def write_stream(deltas, placeholder):
+    """
+    텍스트 조각을 st.empty() 자리 표시자에 이어서 표시하고, 완성된 텍스트를 반환합니다.
+    :param deltas: 텍스트 조각 이터러블 (예: stream_letter(...))
+    :param placeholder: st.empty()로 만든 자리 표시자
+    :return: 전체 텍스트 (오류 시 오류 안내 문구)
+    """
+    content = ""
+    try:
+        for delta in deltas:
+            content += delta
+            placeholder.markdown(content)
+    except Exception as e:
+        print(f"스트리밍 생성 중 오류 발생: {e}")
+        placeholder.empty()
+        return ERROR_MESSAGE
+    return content.strip()
 
 
-def generate_and_save_song(lyrics, title, genre, output_file, api_key):
-    url = "https://api.suno.ai/generate"  # Suno API의 엔드포인트 URL입니다.
-    headers = {
+
+
+
+# Suno 요청/폴링 설정
+SUNO_BASE_URL = os.getenv("SUNO_BASE_URL", "https://api.suno.ai")
+SUNO_POLL_INTERVAL = float(os.getenv("SUNO_POLL_INTERVAL", "5"))
+SUNO_POLL_TIMEOUT = float(os.getenv("SUNO_POLL_TIMEOUT", "600"))
+
+def _suno_headers(api_key):
+    return {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
-    payload = {
+
+def _song_payload(lyrics, title, genre):
+    return {
         "lyrics": lyrics,
         "title": title,
         "genre": genre,
         "model": "chirp-v3.5"  # 사용할 모델 버전입니다.
     }
 
+@traced()
+def submit_song(lyrics, title, genre, api_key):
+    """
+    Suno에 노래 생성 요청을 보내고 응답 JSON을 반환합니다.
+    응답에는 바로 쓸 수 있는 audio_url 또는 폴링에 사용할 작업 id가 들어 있습니다.
+    """
+    url = f"{SUNO_BASE_URL}/generate"  # Suno API의 엔드포인트 URL입니다.
+    with get_limiter("suno").slot():
+        response = http_client.post(url, json=_song_payload(lyrics, title, genre), headers=_suno_headers(api_key), idempotent=False)
+    response.raise_for_status()  # HTTP 오류 발생 시 예외 처리
+    return response.json()
+
+@traced()
+def poll_song(task_id, api_key):
+    """
+    Suno 생성 작업의 상태를 한 번 조회합니다.
+    :return: (상태 문자열, audio_url 또는 None)
+    """
+    with get_limiter("suno").slot():
+        response = http_client.get(f"{SUNO_BASE_URL}/feed/{task_id}", headers=_suno_headers(api_key))
+    response.raise_for_status()
+    data = response.json()
+    clip = data[0] if isinstance(data, list) and data else data
+    return clip.get("status", ""), clip.get("audio_url")
+
+@traced()
+def wait_for_song_url(data, api_key, poll_interval=SUNO_POLL_INTERVAL, timeout=SUNO_POLL_TIMEOUT):
+    """
+    생성 요청 응답에서 audio_url을 꺼내고, 없으면 작업 id로 완료될 때까지 폴링합니다.
+    :return: 노래 오디오 URL
+    """
+    if data.get("audio_url"):
+        return data["audio_url"]
+    task_id = data.get("id") or data.get("task_id")
+    if not task_id:
+        raise ValueError("생성된 노래의 URL을 가져올 수 없습니다.")
+
+    deadline = time.monotonic() + timeout
+    while True:
+        status, song_url = poll_song(task_id, api_key)
+        if status in ("error", "failed"):
+            raise ValueError(f"노래 생성에 실패했습니다. (상태: {status})")
+        if song_url and status in ("complete", "completed", "streaming", ""):
+            return song_url
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"노래 생성이 {timeout:.0f}초 안에 끝나지 않았습니다.")
+        time.sleep(poll_interval)
+
+def sniff_audio_format(head, content_type=""):
+    """
+    파일 앞부분의 매직 바이트와 Content-Type 헤더로 오디오 형식을 판별합니다.
+    :param head: 응답 본문의 첫 바이트들
+    :param content_type: 응답의 Content-Type 헤더 값
+    :return: "mp3", "aac", "wav", "ogg", "flac", "mp4" 또는 None (알 수 없음)
+    """
+    if head.startswith(b"ID3"):
+        return "mp3"
+    if len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # 프레임 동기화 비트 뒤의 layer 비트가 00이면 MPEG 오디오가 아니라 ADTS AAC입니다.
+        return "mp3" if head[1] & 0x06 != 0 else "aac"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    content_type = content_type.split(";")[0].strip().lower()
+    return {
+        "audio/mpeg": "mp3",
+        "audio/mp3": "mp3",
+        "audio/aac": "aac",
+        "audio/wav": "wav",
+        "audio/x-wav": "wav",
+        "audio/ogg": "ogg",
+        "audio/flac": "flac",
+        "audio/mp4": "mp4",
+    }.get(content_type)
+
+@traced()
+def download_audio(url, output_file, target_format="mp3", chunk_size=64 * 1024):
+    """
+    오디오를 내려받아 output_file로 저장합니다.
+    원본이 이미 target_format이면 디코딩 없이 청크 단위로 바로 기록하고,
+    형식이 다를 때만 ffmpeg 파이프로 스트리밍 변환합니다 (PCM 전체를 메모리에 올리지 않음).
+    :return: (output_file, 원본 형식)
+    """
+    response = http_client.get(url, stream=True)
+    tmp_file = f"{output_file}.part"
+    try:
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=chunk_size)
+        head = b""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= 16:
+                break
+        source_format = sniff_audio_format(head, response.headers.get("Content-Type", ""))
+        download_span = tracing.current_span()
+        download_span.first_byte()
+        download_span.set("source_format", source_format)
+
+        if source_format == target_format:
+            with open(tmp_file, "wb") as f:
+                f.write(head)
+                for chunk in chunks:
+                    f.write(chunk)
+        elif source_format == "mp4":
+            # MP4/M4A는 moov 박스가 파일 끝에 올 수 있어 파이프 입력으로 읽을 수 없으므로
+            # 원본을 디스크에 그대로 받은 뒤 ffmpeg가 파일에서 읽도록 합니다.
+            source_file = f"{tmp_file}.src"
+            try:
+                with open(source_file, "wb") as f:
+                    f.write(head)
+                    for chunk in chunks:
+                        f.write(chunk)
+                _transcode_stream(source_file, (), tmp_file, target_format)
+            finally:
+                if os.path.exists(source_file):
+                    os.remove(source_file)
+        else:
+            _transcode_stream("pipe:0", itertools.chain([head], chunks), tmp_file, target_format)
+        download_span.add("bytes", os.path.getsize(tmp_file))
+        os.replace(tmp_file, output_file)
+        return output_file, source_format
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    finally:
+        response.close()
+
+@traced()
+def _transcode_stream(source, chunks, output_file, target_format):
+    # source가 "pipe:0"이면 받은 바이트를 그대로 ffmpeg 표준 입력에 흘려 보내 변환합니다.
+    from pydub import AudioSegment  # pydub에 설정된 ffmpeg 경로를 사용합니다
+    # stderr를 파이프로 받으면 표준 입력을 쓰는 동안 아무도 읽지 않아, ffmpeg가 오류 출력으로
+    # 파이프 버퍼를 채우는 순간 양쪽이 서로를 기다리며 멈춥니다. 임시 파일로 받아 두었다가 읽습니다.
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            [AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-y",
+             "-i", source, "-f", target_format, output_file],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+        )
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass  # ffmpeg가 먼저 종료된 경우 아래에서 반환 코드로 오류를 알립니다
+        process.communicate()
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"오디오 변환에 실패했습니다: {stderr.read().decode(errors='replace').strip()}")
+
+@traced()
+def create_song_file(lyrics, title, genre, output_file, api_key, use_cache=True):
+    """
+    노래를 생성하고 다운로드해 output_file로 저장합니다. 오류는 예외로 전달합니다.
+    백그라운드 작업처럼 Streamlit 화면 밖에서 호출할 때 사용합니다.
+    :return: output_file
+    """
+    # 같은 가사/제목/장르로 만든 노래가 캐시에 있으면 바로 재사용합니다.
+    cache_key = make_key("song", **_song_payload(lyrics, title, genre))
+    if use_cache and CACHE_ENABLED and result_cache.restore_file(cache_key, output_file):
+        return output_file
+
+    # 노래 생성 요청
+    data = submit_song(lyrics, title, genre, api_key)
+    song_url = wait_for_song_url(data, api_key)
+
+    # 오디오 파일 다운로드 및 저장 (이미 MP3이면 변환 없이 그대로 기록)
+    download_audio(song_url, output_file, target_format="mp3")
+    if use_cache and CACHE_ENABLED:
+        result_cache.put_file(cache_key, output_file)
+    return output_file
+
+@traced()
+def generate_and_save_song(lyrics, title, genre, output_file, api_key, use_cache=True):
+    import streamlit as st
     try:
-        # 노래 생성 요청
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()  # HTTP 오류 발생 시 예외 처리
-
-        data = response.json()
-        song_url = data.get("audio_url")
-        if not song_url:
-            st.error("생성된 노래의 URL을 가져올 수 없습니다.")
-            return None
-
-        # 오디오 파일 다운로드
-        audio_response = requests.get(song_url)
-        audio_response.raise_for_status()
-
-        # 오디오 파일 저장
-        audio = AudioSegment.from_file(BytesIO(audio_response.content))
-        audio.export(output_file, format="mp3")
+        create_song_file(lyrics, title, genre, output_file, api_key, use_cache)
         st.success(f"노래가 성공적으로 생성되어 '{output_file}'로 저장되었습니다.")
         return output_file
 
     except requests.exceptions.HTTPError as http_err:
+        tracing.record_error(http_err)
         st.error(f"HTTP 오류 발생: {http_err}")
     except requests.exceptions.RequestException as req_err:
+        tracing.record_error(req_err)
         st.error(f"요청 중 오류 발생: {req_err}")
+    except (ValueError, TimeoutError) as e:
+        tracing.record_error(e)
+        st.error(str(e))
     except Exception as e:
+        tracing.record_error(e)
         st.error(f"예기치 않은 오류 발생: {e}")
 
     return None
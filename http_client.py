@@ -0,0 +1,280 @@
+import mimetypes
+import os
+import random
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+# 업스트림 호스트별로 keep-alive 세션을 공유하는 HTTP 전송 계층입니다.
+# func.py의 모든 API 호출(ElevenLabs, Suno, 오디오 CDN)은 이 모듈을 통해 나갑니다.
+
+# 타임아웃/재시도 설정 (환경 변수로 조정 가능)
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "10"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+
+# 재시도 대상 HTTP 상태 코드
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# 멱등이 아닌 요청(노래 생성, 목소리 등록 등)은 서버가 요청을 처리하지 않았다고 확실한 상태 코드에서만 재시도합니다.
+NON_IDEMPOTENT_RETRY_STATUSES = frozenset({429, 503})
+
+_lock = threading.Lock()
+_sessions = {}
+_stats = {}
+
+
+def _host_key(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def get_session(url):
+    """
+    URL의 호스트에 해당하는 풀링된 requests.Session을 반환합니다.
+    호스트마다 세션이 하나씩 만들어지고 프로세스 전체에서 재사용됩니다.
+    :param url: 요청할 URL (스킴과 호스트만 사용)
+    :return: requests.Session
+    """
+    key = _host_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+            _stats[key] = {
+                "requests": 0,
+                "retries": 0,
+                "failures": 0,
+                "total_time": 0.0,
+            }
+        return session
+
+
+def _record(key, field, value=1):
+    with _lock:
+        _stats[key][field] += value
+
+
+def _backoff_delay(attempt, response=None):
+    """
+    재시도 대기 시간을 계산합니다. 429의 Retry-After 헤더가 있으면 우선합니다.
+    그 외에는 지수 백오프에 full jitter를 적용합니다.
+    """
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+    ceiling = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+class MultipartStream:
+    """
+    multipart/form-data 본문을 파일에서 조금씩 읽어 보내는 스트림입니다.
+    requests의 files= 인자는 본문 전체를 메모리에 만들기 때문에, 큰 음성 파일은
+    data=MultipartStream(...)과 headers={"Content-Type": stream.content_type}로 보냅니다.
+    """
+
+    def __init__(self, fields, file_field, fileobj, filename, file_content_type=None):
+        """
+        :param fields: 일반 폼 필드 {이름: 값}
+        :param file_field: 파일 필드 이름
+        :param fileobj: 읽기 가능하고 seek 가능한 바이너리 파일 객체
+        :param filename: 업로드할 파일 이름
+        :param file_content_type: 파일 MIME 타입 (기본값: 파일 이름으로 추측)
+        """
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        file_content_type = file_content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+        head = b""
+        for name, value in fields.items():
+            head += (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode("utf-8")
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f"Content-Type: {file_content_type}\r\n\r\n"
+        ).encode("utf-8")
+        self._head = head
+        self._tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self._file = fileobj
+        self._file_start = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        self._file_size = fileobj.tell() - self._file_start
+        self.seek(0)
+
+    def __len__(self):
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # 재시도용 되감기만 지원합니다.
+        if offset != 0 or whence != os.SEEK_SET:
+            raise ValueError("MultipartStream은 처음으로만 되감을 수 있습니다.")
+        self._file.seek(self._file_start)
+        self._parts = [self._head, None, self._tail]
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self)
+        out = b""
+        while self._parts and len(out) < size:
+            part = self._parts[0]
+            if part is None:
+                data = self._file.read(size - len(out))
+                if data:
+                    out += data
+                    continue
+                self._parts.pop(0)
+            else:
+                take = size - len(out)
+                out += part[:take]
+                if take >= len(part):
+                    self._parts.pop(0)
+                else:
+                    self._parts[0] = part[take:]
+        return out
+
+
+def _rewind_files(files, data=None):
+    # 재시도 시 업로드 본문을 처음부터 다시 보내기 위해 되감습니다.
+    if isinstance(data, MultipartStream):
+        data.seek(0)
+    if not files:
+        return
+    values = files.values() if isinstance(files, dict) else (v for _, v in files)
+    for value in values:
+        fileobj = value[1] if isinstance(value, tuple) else value
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+
+
+def _is_connect_error(exc):
+    # 연결 수립 단계에서 실패해 요청이 서버에 전달되지 않은 경우에만 True입니다.
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+    return False
+
+
+def request(method, url, timeout=None, max_retries=None, idempotent=True, **kwargs):
+    """
+    풀링된 세션으로 HTTP 요청을 보내고, 429/5xx 및 연결 오류 시 지터 백오프로 재시도합니다.
+    :param method: HTTP 메서드 ("GET", "POST" 등)
+    :param url: 요청 URL
+    :param timeout: (connect, read) 타임아웃 튜플 (기본값: 환경 변수 설정)
+    :param max_retries: 최대 재시도 횟수 (기본값: HTTP_MAX_RETRIES)
+    :param idempotent: False이면 다시 보내도 안전한 경우(연결 실패, 429/503)에만 재시도합니다.
+                       읽기 타임아웃이나 500/502/504는 서버가 이미 처리했을 수 있어 재시도하지 않습니다.
+    :return: 마지막 requests.Response (상태 코드 검사는 호출자가 raise_for_status로 수행)
+    """
+    session = get_session(url)
+    key = _host_key(url)
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    if max_retries is None:
+        max_retries = MAX_RETRIES
+    retry_statuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+
+    attempt = 0
+    while True:
+        if attempt:
+            _rewind_files(kwargs.get("files"), kwargs.get("data"))
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            _record(key, "total_time", time.perf_counter() - start)
+            _record(key, "requests")
+            if attempt >= max_retries or not (idempotent or _is_connect_error(e)):
+                _record(key, "failures")
+                raise
+            _record(key, "retries")
+            tracing.add("retries")
+            time.sleep(_backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        _record(key, "total_time", time.perf_counter() - start)
+        _record(key, "requests")
+        tracing.add("http_requests")
+        if response.status_code in retry_statuses and attempt < max_retries:
+            _record(key, "retries")
+            tracing.add("retries")
+            delay = _backoff_delay(attempt, response)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if response.status_code >= 400:
+            _record(key, "failures")
+        return response
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+def pool_stats():
+    """
+    호스트별 요청/재시도/실패 횟수, 평균 응답 시간, 커넥션 풀 상태를 반환합니다.
+    :return: {호스트: 통계 dict}
+    """
+    with _lock:
+        snapshot = {key: dict(values) for key, values in _stats.items()}
+        sessions = dict(_sessions)
+
+    for key, values in snapshot.items():
+        values["avg_time"] = values["total_time"] / values["requests"] if values["requests"] else 0.0
+        # urllib3 커넥션 풀에서 실제로 열린 커넥션 수와 처리한 요청 수를 가져옵니다.
+        # 요청 수가 커넥션 수보다 크면 keep-alive 재사용이 일어난 것입니다.
+        connections = 0
+        pooled_requests = 0
+        adapter = sessions[key].get_adapter(key)
+        pools = adapter.poolmanager.pools
+        for pool_key in list(pools.keys()):
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            connections += getattr(pool, "num_connections", 0)
+            pooled_requests += getattr(pool, "num_requests", 0)
+        values["connections_opened"] = connections
+        values["connections_reused"] = max(pooled_requests - connections, 0)
+    return snapshot
+
+
+def close_all():
+    """
+    모든 세션을 닫고 통계를 초기화합니다.
+    """
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _stats.clear()
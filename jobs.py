@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from artifacts import artifact_store
+from func import create_song_file
+
+# Suno 노래 생성을 Streamlit 스크립트 밖에서 실행하는 백그라운드 작업 큐입니다.
+# 작업 테이블은 프로세스 전체에서 공유되므로 화면이 다시 실행되어도 작업이 유지되고,
+# 화면에서는 st.session_state에 작업 id만 보관한 채 get_job()으로 상태를 폴링합니다.
+
+SONG_WORKERS = int(os.getenv("SONG_WORKERS", "2"))
+SONG_JOB_TTL = float(os.getenv("SONG_JOB_TTL", "3600"))  # 끝난 작업을 작업 테이블에 남겨 둘 시간(초)
+
+# 작업 상태
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_executor = ThreadPoolExecutor(max_workers=SONG_WORKERS, thread_name_prefix="song-job")
+_lock = threading.Lock()
+_jobs = {}
+_futures = {}  # 작업 id → 실행 Future (wait_job/add_job_callback용)
+_latencies = []  # 완료된 작업의 (대기 시간, 실행 시간), 최근 것만 보관
+_MAX_LATENCY_SAMPLES = 1000
+
+
+def _job_id(lyrics, title, genre):
+    # 같은 가사/제목/장르의 요청은 같은 작업 id를 갖도록 내용으로 id를 만듭니다.
+    raw = json.dumps([lyrics, title, genre], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _reusable(job):
+    # 대기/실행 중이거나, 완료되었고 결과 파일이 아직 남아 있는 작업이면 그대로 다시 씁니다.
+    if job is None or job["status"] == FAILED:
+        return False
+    return job["status"] != DONE or os.path.exists(job["result_path"])
+
+
+def _prune_finished(now):
+    # 끝난 지 SONG_JOB_TTL이 지난 작업을 테이블에서 지웁니다 (_lock을 잡은 상태에서 호출).
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job["finished_at"] is not None and now - job["finished_at"] > SONG_JOB_TTL
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+        _futures.pop(job_id, None)
+
+
+def submit_song_job(lyrics, title, genre, api_key, output_file=None):
+    """
+    노래 생성 작업을 큐에 넣고 작업 id를 반환합니다.
+    같은 가사/제목/장르로 대기 중이거나 실행 중, 또는 완료된 작업이 있으면 새로 만들지 않고 그 id를 반환합니다
+    (완료된 작업의 결과 파일이 저장소 한도 때문에 정리되었으면 다시 생성합니다.)
+    :param lyrics: 노래 가사
+    :param title: 노래 제목
+    :param genre: 노래 장르
+    :param api_key: Suno API 키
+    :param output_file: 저장할 노래 파일 경로 (기본값: 아티팩트 저장소의 jobs/<작업 id>/song.mp3)
+    :return: 작업 id
+    """
+    job_id = _job_id(lyrics, title, genre)
+    with _lock:
+        _prune_finished(time.time())
+        if _reusable(_jobs.get(job_id)):
+            return job_id
+    # 새 작업을 만들 때만 경로를 발급합니다 (발급 시 용량 정리가 돌 수 있어 중복 요청에서는 피합니다).
+    if output_file is None:
+        output_file = artifact_store.job_path(job_id, "song.mp3")
+    with _lock:
+        if _reusable(_jobs.get(job_id)):
+            return job_id
+        _jobs[job_id] = {
+            "id": job_id,
+            "status": QUEUED,
+            "genre": genre,
+            "result_path": None,
+            "error": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        # 작업을 요청한 세션의 correlation id가 작업 span에 이어지도록 컨텍스트를 넘깁니다.
+        _futures[job_id] = _executor.submit(tracing.propagate(_run_job), job_id, lyrics, title, genre, output_file, api_key)
+    return job_id
+
+
+def _run_job(job_id, lyrics, title, genre, output_file, api_key):
+    with _lock:
+        _jobs[job_id]["status"] = RUNNING
+        _jobs[job_id]["started_at"] = time.time()
+        queued_for = _jobs[job_id]["started_at"] - _jobs[job_id]["submitted_at"]
+    try:
+        # 작업 id는 결과 파일 경로(jobs/<작업 id>/song.mp3)가 되므로 /spans로 노출되는 span 속성에 넣지 않습니다.
+        with tracing.span("jobs.song", genre=genre, queued_seconds=queued_for):
+            result_path = create_song_file(lyrics, title, genre, output_file, api_key)
+        update = {"status": DONE, "result_path": result_path}
+    except Exception as e:
+        update = {"status": FAILED, "error": str(e)}
+    with _lock:
+        job = _jobs[job_id]
+        job.update(update)
+        job["finished_at"] = time.time()
+        _latencies.append((job["started_at"] - job["submitted_at"], job["finished_at"] - job["started_at"]))
+        del _latencies[:-_MAX_LATENCY_SAMPLES]
+
+
+def get_job(job_id):
+    """
+    작업 정보를 복사해 반환합니다.
+    :return: {"id", "status", "result_path", "error", ...} 또는 None (없거나 끝난 지 SONG_JOB_TTL이 지나 정리된 작업)
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+
+def add_job_callback(job_id, callback):
+    """
+    작업이 끝나면(성공/실패 모두) callback(작업 정보 dict)을 호출합니다. 이미 끝났으면 바로 호출합니다.
+    """
+    with _lock:
+        future = _futures[job_id]
+    future.add_done_callback(lambda _: callback(get_job(job_id)))
+
+
+def wait_job(job_id, timeout=None):
+    """
+    작업이 끝날 때까지 기다린 뒤 작업 정보를 반환합니다 (배치처럼 화면 없이 실행할 때 사용).
+    :param timeout: 최대 대기 시간(초), 넘으면 TimeoutError
+    :return: 작업 정보 dict
+    """
+    with _lock:
+        future = _futures[job_id]
+    future.result(timeout=timeout)
+    return get_job(job_id)
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def queue_stats():
+    """
+    큐 깊이와 작업 지연 시간 통계를 반환합니다.
+    :return: 상태별 작업 수, 대기/실행 시간 p50/p95
+    """
+    with _lock:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in _jobs.values():
+            counts[job["status"]] += 1
+        waits = [w for w, _ in _latencies]
+        runs = [r for _, r in _latencies]
+    return {
+        "queue_depth": counts[QUEUED],
+        "running": counts[RUNNING],
+        "done": counts[DONE],
+        "failed": counts[FAILED],
+        "wait_p50": _percentile(waits, 0.5),
+        "wait_p95": _percentile(waits, 0.95),
+        "run_p50": _percentile(runs, 0.5),
+        "run_p95": _percentile(runs, 0.95),
+    }
+
+
+tracing.register_gauges("song_jobs", queue_stats)
@@ -0,0 +1,13 @@
+# 키(내용 해시 등)별로 작업을 직렬화할 때 쓰는 잠금 도구입니다.
+
+
+def striped_lock(key, locks):
+    """
+    16진수 해시 키에 해당하는 잠금을 고정된 잠금 배열에서 골라 반환합니다.
+    키마다 잠금을 새로 만들면 처리한 키 수만큼 끝없이 늘어나므로, 잠금 몇십 개를 나눠 쓰고
+    서로 다른 키가 가끔 같은 잠금을 기다리는 것은 감수합니다.
+    :param key: 16진수 해시 문자열 (앞 8자리를 사용)
+    :param locks: threading.Lock 리스트
+    :return: key에 해당하는 잠금
+    """
+    return locks[int(key[:8], 16) % len(locks)]
@@ -1,14 +1,42 @@
 # streamlit run C:\Users\user\Desktop\psh\project\MelodyGram\main.py
 import streamlit as st
 from func import *
+from pipeline import GenerationPipeline, GenreFanout
+from jobs import submit_song_job, get_job
+from voice_registry import register_voice
+from artifacts import artifact_store, start_artifact_server
+import tracing
 
 import os
+import time
+import uuid
 from dotenv import load_dotenv
 
+# 선택할 수 있는 노래 장르
+GENRES = ["Ballad", "Dance", "Hip-Hop/Rap", "R&B/Soul", "Trot", "Indie", "Jazz"]
+
+# 단계 이름 → span 이름
+STAGE_SPAN_NAMES = {
+    "입력 단계": "input",
+    "목소리 등록": "voice",
+    "결과 확인": "result",
+}
+
 def main():
     suno_api_key = os.getenv('SUNO_API_KEY')
     
     st.set_page_config(page_title="MelodyGram", page_icon="🎶", layout="centered")
+
+    # 세션마다 correlation id를 하나 정해 이 세션에서 실행되는 모든 span(백그라운드 작업 포함)에 붙입니다.
+    if "correlation_id" not in st.session_state:
+        st.session_state["correlation_id"] = tracing.new_correlation_id()
+    tracing.set_correlation_id(st.session_state["correlation_id"])
+    tracing.start_metrics_server()  # METRICS_PORT가 설정된 경우에만 /metrics를 엽니다
+    start_artifact_server()  # ARTIFACT_SERVER_PORT가 설정된 경우에만 오디오를 Range 요청으로 제공합니다
+
+    # 세션마다 결과 파일을 따로 저장해 동시에 접속한 사용자끼리 파일을 덮어쓰지 않게 합니다.
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
     
     # 단계 상태를 session_state로 관리
     if "stage" not in st.session_state:
@@ -46,7 +74,19 @@ def main():
     st.progress((stage_index + 1) / len(stage_options))
     st.metric(label="현재 진행 단계", value=f"{stage_index + 1} / {len(stage_options)}")
 
-    # 현재 단계 로직
+    # 현재 단계 로직 (단계별 span으로 소요 시간과 다음 단계로의 전환을 기록)
+    stage = st.session_state["stage"]
+    with tracing.span(f"main.{STAGE_SPAN_NAMES[stage]}") as stage_span:
+        _render_stage(suno_api_key)
+        if st.session_state["stage"] != stage:
+            stage_span.set("next_stage", STAGE_SPAN_NAMES[st.session_state["stage"]])
+
+
+def _render_stage(suno_api_key):
+    """
+    현재 단계(입력 단계, 목소리 등록, 결과 확인)의 화면을 그립니다.
+    :param suno_api_key: Suno API 키
+    """
     if st.session_state["stage"] == "입력 단계":
         st.header("🖊️ 1. 감사 내용을 입력해주세요")
 
@@ -60,11 +100,11 @@ def main():
             )
         with st.expander("3. 편지 분량 설정"):
             min_wc = st.text_input("최소 글자 수 (기본: 30)", value=str(st.session_state["min_wc"]))
-        
+    
         # 최소 글자 수 업데이트
         if min_wc and min_wc.isdigit():  # 숫자인 경우만 업데이트
             st.session_state["min_wc"] = int(min_wc)
-            
+        
         st.info("입력한 내용을 바탕으로 진심 어린 편지와 노래를 생성합니다. 예시를 참고하세요.")
 
         if st.button("다음 단계로 이동"):
@@ -73,9 +113,12 @@ def main():
                     "recipient": recipient,
                     "appreciation": appreciation
                 }
-                # 편지 생성
-                with st.spinner("편지를 생성하고 있습니다..."):
-                    st.session_state["letter"] = generate_letter(recipient, appreciation, st.session_state["min_wc"])
+                # 편지 생성 (생성되는 대로 화면에 표시)
+                st.subheader("🖊️ 편지를 생성하고 있습니다...")
+                st.session_state["letter"] = write_stream(stream_letter(recipient, appreciation, st.session_state["min_wc"]), st.empty())
+                # 편지가 바뀌면 이전 편지로 만든 장르별 결과는 버립니다.
+                st.session_state["genre_results"] = {}
+                st.session_state["fanout"] = None
                 st.session_state["stage"] = "목소리 등록"
             else:
                 st.warning("모든 입력 필드를 채워주세요.")
@@ -89,7 +132,7 @@ def main():
         if st.button("목소리 등록"):
             if uploaded_file:
                 with st.spinner("사용자 목소리를 등록하고 있습니다..."):
-                    voice_id = upload_user_voice(uploaded_file.name)
+                    voice_id = register_voice(uploaded_file)
                     if voice_id:
                         st.session_state["voice_id"] = voice_id
                         st.success("목소리 등록 완료!")
@@ -118,37 +161,173 @@ def main():
 
         # 노래 장르 선택
         st.subheader("🎶 노래 장르 선택")         
-        genre = st.selectbox("노래 장르를 선택하세요:", ["Ballad", "Dance", "Hip-Hop/Rap", "R&B/Soul", "Trot", "Indie", "Jazz"])
+        genre = st.selectbox("노래 장르를 선택하세요:", GENRES)
+
+        # 장르별 결과 저장소 (이미 만든 장르로 돌아가면 다시 생성하지 않고 바로 보여줌)
+        genre_results = st.session_state.setdefault("genre_results", {})
 
-        # 장르 변경 시 가사 및 노래만 다시 생성
+        # 장르 변경 시 가사 및 노래만 다시 생성 (저장된 결과가 있으면 그대로 사용)
         if genre != st.session_state["genre"]:
             st.session_state["genre"] = genre
-            st.session_state["lyrics"] = None
-            st.session_state["title"] = None
-            st.session_state["song_path"] = None
+            stored = genre_results.get(genre, {})
+            st.session_state["lyrics"] = stored.get("lyrics")
+            st.session_state["title"] = stored.get("title")
+            st.session_state["song_path"] = stored.get("song_path")
+            st.session_state["song_job_id"] = stored.get("song_job_id")
+
+        # 편지 음성 변환과 가사 생성을 동시에 시작
+        tts_key = (st.session_state["letter"], voice_id, gender)
+        pipeline_key = (tts_key, genre)
+        if st.session_state.get("pipeline_key") != pipeline_key:
+            precomputed = {"letter": st.session_state["letter"]}
+            if st.session_state.get("tts_key") == tts_key and os.path.exists(st.session_state["tts_path"] or ""):
+                precomputed["tts"] = st.session_state["tts_path"]
+            if st.session_state["lyrics"] is not None:
+                precomputed["lyrics"] = (st.session_state["title"], st.session_state["lyrics"])
+            st.session_state["pipeline"] = GenerationPipeline(
+                recipient, appreciation, st.session_state["min_wc"], genre,
+                gender=gender, voice_id=voice_id, suno_api_key=suno_api_key,
+                stages=("tts", "lyrics"), precomputed=precomputed,
+                tts_output=artifact_store.session_path(st.session_state["session_id"], "letter.mp3"),
+            ).start()
+            st.session_state["pipeline_key"] = pipeline_key
+        pipeline = st.session_state["pipeline"]
 
         # 편지 표시
         st.subheader("🖊️ 생성된 편지")
         st.text_area("생성된 편지:", st.session_state["letter"], height=200)
+        tts_slot = st.empty()
 
-        # 가사 생성
+        # 가사 생성 (음성 변환과 동시에 진행되며, 생성 중인 가사를 바로 표시)
         if st.session_state["lyrics"] is None:
-            with st.spinner("노래 가사를 생성하고 있습니다..."):
-                st.session_state["title"], st.session_state["lyrics"] = generate_lyrics_and_title(recipient, appreciation, st.session_state["letter"], genre)
+            lyrics_slot = st.empty()
+            lyrics_future = pipeline.futures["lyrics"]
+            while not lyrics_future.done():
+                title, partial_lyrics = pipeline.partial.get("lyrics", (None, ""))
+                lyrics_slot.markdown(f"**{title}**\n\n{partial_lyrics}" if title else "노래 가사를 생성하고 있습니다...")
+                time.sleep(0.2)
+            lyrics_slot.empty()
+            st.session_state["title"], st.session_state["lyrics"] = lyrics_future.result()
+            if st.session_state["lyrics"]:
+                genre_results.setdefault(genre, {}).update(title=st.session_state["title"], lyrics=st.session_state["lyrics"])
+
+        with tts_slot.container():
+            with st.spinner("편지를 음성으로 변환하고 있습니다..."):
+                st.session_state["tts_path"] = pipeline.futures["tts"].result()
+                st.session_state["tts_key"] = tts_key
+            tts_audio = artifact_store.audio_source(st.session_state["tts_path"])
+            if tts_audio is not None:
+                st.audio(tts_audio, format='audio/mp3')
+
         st.subheader("🎶 생성된 노래 가사")
         st.text_area("생성된 노래 가사:", st.session_state["lyrics"], height=200)
-        
+    
 
         # 생성된 노래 표시
         st.subheader("🎵 생성된 노래")
-        # 노래 생성 버튼 
+        # 노래 생성 버튼 (백그라운드 작업으로 등록하고 작업 id만 보관)
         if st.button("노래 생성하기"):
-            with st.spinner("노래를 생성하고 있습니다..."):
-            
-                st.session_state["song_path"] = generate_and_save_song(st.session_state["lyrics"], st.session_state["title"] ,st.session_state["genre"], 'C:/Users/user/Desktop/psh/project/MelodyGram/gift_song.mp3', suno_api_key)
+            st.session_state["song_job_id"] = submit_song_job(st.session_state["lyrics"], st.session_state["title"], st.session_state["genre"], suno_api_key)
+            st.session_state["song_path"] = None
+            genre_results.setdefault(genre, {}).update(song_job_id=st.session_state["song_job_id"], song_path=None)
+
+        waiting_for_song = False  # 진행 중인 노래 작업이 있으면 화면을 모두 그린 뒤 잠시 후 다시 실행합니다
+        job_id = st.session_state.get("song_job_id")
+        if job_id and not st.session_state["song_path"]:
+            job = get_job(job_id)
+            if job is None:
+                st.session_state["song_job_id"] = None
+            elif job["status"] == "done":
+                st.session_state["song_path"] = job["result_path"]
+                genre_results.setdefault(genre, {})["song_path"] = job["result_path"]
+                st.success("노래가 성공적으로 생성되었습니다.")
+            elif job["status"] == "failed":
+                st.error(f"노래 생성 중 오류 발생: {job['error']}")
+            else:
+                st.info("노래를 생성하고 있습니다... 다른 항목을 살펴보셔도 작업은 계속됩니다.")
+                waiting_for_song = True
 
         if st.session_state["song_path"]:
-            st.audio(st.session_state["song_path"], format='audio/mp3')
+            song_audio = artifact_store.audio_source(st.session_state["song_path"])
+            if song_audio is not None:
+                st.audio(song_audio, format='audio/mp3')
+            else:
+                st.warning("저장 공간 정리로 노래 파일이 삭제되었습니다. 다시 생성해 주세요.")
+
+        # 여러 장르 동시 생성 (장르별 가사를 병렬로 만들고, 끝나는 대로 비교 화면에 표시)
+        st.subheader("🎼 여러 장르 비교")
+        compare_genres = st.multiselect("한 번에 만들어 비교할 장르를 선택하세요:", GENRES, default=st.session_state.get("compare_genres", []))
+        compare_songs = st.checkbox("노래까지 함께 생성하기")
+        if st.button("선택한 장르 동시 생성") and compare_genres:
+            st.session_state["compare_genres"] = compare_genres
+            missing = [g for g in compare_genres if not genre_results.get(g, {}).get("lyrics")]
+            st.session_state["fanout"] = GenreFanout(
+                recipient, appreciation, st.session_state["letter"], missing,
+                min_wc=st.session_state["min_wc"], suno_api_key=suno_api_key, with_songs=compare_songs,
+            ).start() if missing else None
+            if compare_songs:
+                # 가사가 이미 있는 장르는 노래 작업만 바로 등록합니다.
+                # 작업이 실패했거나 끝난 지 오래되어 정리된 경우에도 다시 등록합니다.
+                for g in compare_genres:
+                    stored = genre_results.get(g, {})
+                    song_job = get_job(stored["song_job_id"]) if stored.get("song_job_id") else None
+                    if g not in missing and (song_job is None or song_job["status"] == "failed"):
+                        stored["song_job_id"] = submit_song_job(stored["lyrics"], stored["title"], g, suno_api_key)
+
+        compare = st.session_state.get("compare_genres", [])
+        fanout = st.session_state.get("fanout")
+        if compare:
+            slots = {g: tab.empty() for g, tab in zip(compare, st.tabs(compare))}
+
+            def collect_fanout_results():
+                for g, stage_name, result in fanout.poll():
+                    if stage_name != "lyrics":
+                        continue
+                    if isinstance(result, Exception) or not result[1]:
+                        genre_results[g] = {"error": str(result) if isinstance(result, Exception) else result[0]}
+                    else:
+                        genre_results.setdefault(g, {}).update(title=result[0], lyrics=result[1], error=None)
+                for g, song_job_id in list(fanout.song_jobs.items()):
+                    genre_results.setdefault(g, {}).setdefault("song_job_id", song_job_id)
+
+            # 끝난 장르부터 결과를 저장하고, 생성 중인 장르는 지금까지의 가사를 보여줍니다.
+            while fanout is not None and not fanout.lyrics_done():
+                collect_fanout_results()
+                for g in compare:
+                    if g in fanout.pipelines and not genre_results.get(g, {}).get("lyrics"):
+                        title, partial_lyrics = fanout.partial(g)
+                        slots[g].markdown(f"**{title}**\n\n{partial_lyrics}" if title else "노래 가사를 생성하고 있습니다...")
+                time.sleep(0.2)
+            if fanout is not None:
+                collect_fanout_results()
+
+            for g in compare:
+                stored = genre_results.get(g, {})
+                with slots[g].container():
+                    if not stored.get("lyrics"):
+                        st.error(f"가사 생성에 실패했습니다: {stored.get('error')}" if stored.get("error") else "아직 생성되지 않았습니다.")
+                        continue
+                    st.markdown(f"**{stored['title']}**")
+                    st.text(stored["lyrics"])
+                    song_job = get_job(stored["song_job_id"]) if stored.get("song_job_id") else None
+                    if song_job is None:
+                        continue
+                    if song_job["status"] == "done":
+                        stored["song_path"] = song_job["result_path"]
+                        song_audio = artifact_store.audio_source(stored["song_path"])
+                        if song_audio is not None:
+                            st.audio(song_audio, format='audio/mp3')
+                    elif song_job["status"] == "failed":
+                        st.error(f"노래 생성 중 오류 발생: {song_job['error']}")
+                    else:
+                        st.info("노래를 생성하고 있습니다...")
+                        waiting_for_song = True
+
+        if waiting_for_song:
+            time.sleep(2)
+            rerun = getattr(st, "rerun", None) or st.experimental_rerun
+            rerun()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,328 @@
+import contextvars
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from artifacts import artifact_store
+from func import (
+    ERROR_MESSAGE,
+    create_song_file,
+    generate_letter,
+    stream_lyrics_and_title,
+    text_to_speech1,
+    text_to_speech_with_user_voice,
+)
+from jobs import add_job_callback, submit_song_job
+import tracing
+from voice_registry import touch_voice
+
+# 편지 → {편지 음성 변환, 가사 → 노래} 의존 그래프를 스레드 풀에서 실행하는 오케스트레이터입니다.
+# 편지가 나오면 음성 변환과 가사 생성이 동시에 시작되므로 전체 소요 시간은 가장 긴 경로로 줄어듭니다.
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+
+# 단계별 선행 단계
+STAGE_DEPENDENCIES = {
+    "letter": (),
+    "tts": ("letter",),
+    "lyrics": ("letter",),
+    "song": ("lyrics",),
+}
+
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+
+
+class GenerationPipeline:
+    """
+    입력을 한 번 받아 편지, 편지 음성, 가사, 노래 생성을 의존 관계에 따라 병렬로 실행합니다.
+    각 단계는 futures[단계]로 결과를 기다리거나 progress()로 상태를 확인할 수 있습니다.
+    """
+
+    def __init__(self, recipient, appreciation, min_wc, genre, gender="여성", voice_id=None,
+                 suno_api_key=None, stages=("letter", "tts", "lyrics", "song"), precomputed=None,
+                 tts_output=None, song_output=None):
+        """
+        :param recipient: 감사의 대상
+        :param appreciation: 감사 내용
+        :param min_wc: 편지 최소 글자 수
+        :param genre: 노래 장르
+        :param gender: 사용자 목소리가 없을 때 사용할 성별
+        :param voice_id: 등록된 사용자 목소리 ID (있으면 gender보다 우선)
+        :param suno_api_key: Suno API 키
+        :param stages: 실행할 단계 목록 (선행 단계는 자동으로 포함됩니다)
+        :param precomputed: 이미 결과가 있는 단계 {단계: 결과} (예: {"letter": letter})
+        :param tts_output: 편지 음성 파일 경로 (기본값: 아티팩트 저장소의 새 임시 경로)
+        :param song_output: 노래 파일 경로 (기본값: 아티팩트 저장소의 새 임시 경로)
+        """
+        self.recipient = recipient
+        self.appreciation = appreciation
+        self.min_wc = min_wc
+        self.genre = genre
+        self.gender = gender
+        self.voice_id = voice_id
+        self.suno_api_key = suno_api_key
+        self.tts_output = tts_output
+        self.song_output = song_output
+        self.precomputed = dict(precomputed or {})
+        self.stages = self._resolve_stages(stages)
+        self.futures = {stage: Future() for stage in self.stages}
+        self.timings = {}
+        self.partial = {}  # 스트리밍 중인 단계의 중간 결과 (예: {"lyrics": (제목, 지금까지의 가사)})
+        self._status = {stage: "pending" for stage in self.stages}
+        self._lock = threading.Lock()
+        self._started = False
+        self._context = contextvars.copy_context()
+
+    @staticmethod
+    def _resolve_stages(stages):
+        resolved = []
+
+        def visit(stage):
+            for dependency in STAGE_DEPENDENCIES[stage]:
+                visit(dependency)
+            if stage not in resolved:
+                resolved.append(stage)
+
+        for stage in stages:
+            visit(stage)
+        return resolved
+
+    def start(self):
+        """
+        의존성이 없는 단계부터 실행을 시작합니다. 여러 번 호출해도 한 번만 시작됩니다.
+        :return: self
+        """
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        for stage in self.stages:
+            dependencies = STAGE_DEPENDENCIES[stage]
+            if stage in self.precomputed:
+                self._finish(stage, result=self.precomputed[stage])
+            elif not dependencies:
+                self._schedule(stage)
+            else:
+                for dependency in dependencies:
+                    self.futures[dependency].add_done_callback(lambda _, stage=stage: self._on_dependency_done(stage))
+        return self
+
+    def _on_dependency_done(self, stage):
+        # 선행 단계가 모두 끝났을 때 한 번만 실행되도록 합니다.
+        dependencies = [self.futures[d] for d in STAGE_DEPENDENCIES[stage]]
+        if not all(f.done() for f in dependencies):
+            return
+        with self._lock:
+            if self._status[stage] != "pending":
+                return
+            self._status[stage] = "scheduled"
+        failed = next((f for f in dependencies if f.exception() is not None), None)
+        if failed is not None:
+            self._finish(stage, exception=failed.exception())
+            return
+        self._schedule(stage)
+
+    def _schedule(self, stage):
+        # 파이프라인을 만든 요청의 correlation id가 단계 span에 이어지도록 컨텍스트를 넘깁니다.
+        _executor.submit(self._context.copy().run, self._run, stage)
+
+    def _run(self, stage):
+        with self._lock:
+            self._status[stage] = "running"
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"pipeline.{stage}", genre=self.genre):
+                result = getattr(self, f"_run_{stage}")()
+        except Exception as e:
+            self.timings[stage] = time.perf_counter() - start
+            self._finish(stage, exception=e)
+            return
+        self.timings[stage] = time.perf_counter() - start
+        self._finish(stage, result=result)
+
+    def _finish(self, stage, result=None, exception=None):
+        with self._lock:
+            self._status[stage] = "failed" if exception is not None else "done"
+        if exception is not None:
+            self.futures[stage].set_exception(exception)
+        else:
+            self.futures[stage].set_result(result)
+
+    def _run_letter(self):
+        letter = generate_letter(self.recipient, self.appreciation, self.min_wc)
+        if letter == ERROR_MESSAGE:
+            raise RuntimeError("편지 생성에 실패했습니다.")
+        return letter
+
+    def _run_tts(self):
+        letter = self.futures["letter"].result()
+        if self.voice_id:
+            touch_voice(self.voice_id)
+            return text_to_speech_with_user_voice(letter, self.voice_id, self.tts_output)
+        return text_to_speech1(letter, self.gender, self.tts_output)
+
+    def _run_lyrics(self):
+        # 가사를 스트리밍으로 받아 partial["lyrics"]를 갱신하므로 화면에서 생성 중인 가사를 보여줄 수 있습니다.
+        letter = self.futures["letter"].result()
+        title, lyrics = None, ""
+        try:
+            for kind, value in stream_lyrics_and_title(self.recipient, self.appreciation, letter, self.genre):
+                if kind == "title":
+                    title = value
+                else:
+                    lyrics += value
+                self.partial["lyrics"] = (title, lyrics)
+        except Exception as e:
+            tracing.record_error(e)
+            print(f"가사 및 제목 생성 중 오류 발생: {e}")
+            return ERROR_MESSAGE, ""
+        return title, lyrics.strip()
+
+    def _run_song(self):
+        title, lyrics = self.futures["lyrics"].result()
+        if not lyrics:
+            return None
+        output_file = self.song_output or artifact_store.scratch_path(".mp3")
+        return create_song_file(lyrics, title, self.genre, output_file, self.suno_api_key)
+
+    def progress(self):
+        """
+        단계별 상태("pending", "scheduled", "running", "done", "failed")를 반환합니다.
+        """
+        with self._lock:
+            return dict(self._status)
+
+    def fraction_done(self):
+        """
+        끝난 단계의 비율을 0~1 사이 값으로 반환합니다 (진행 바 표시용).
+        """
+        status = self.progress()
+        finished = sum(1 for s in status.values() if s in ("done", "failed"))
+        return finished / len(status) if status else 1.0
+
+    def result(self, timeout=None):
+        """
+        모든 단계가 끝날 때까지 기다린 뒤 {단계: 결과}를 반환합니다.
+        """
+        return {stage: future.result(timeout=timeout) for stage, future in self.futures.items()}
+
+
+def genre_slug(genre):
+    """
+    장르 이름을 파일/디렉터리 이름으로 쓸 수 있게 바꿉니다 (예: "Hip-Hop/Rap" → "hip-hop-rap").
+    """
+    return re.sub(r"[^0-9a-z가-힣]+", "-", genre.lower()).strip("-") or "genre"
+
+
+class GenreFanout:
+    """
+    한 편지로 여러 장르의 가사(와 노래)를 동시에 생성합니다.
+    장르마다 편지를 precomputed로 넘긴 GenerationPipeline으로 가사를 모두 병렬 생성하고,
+    가사가 나오는 대로 노래를 백그라운드 작업 큐(jobs)에 넣어 SONG_WORKERS 한도 안에서 생성합니다.
+    끝난 결과는 완료 순서대로 events()/poll()로 받을 수 있습니다.
+    """
+
+    def __init__(self, recipient, appreciation, letter, genres, min_wc=30, suno_api_key=None,
+                 with_songs=False, song_output_dir=None):
+        """
+        :param letter: 이미 생성된 편지 (모든 장르가 공유)
+        :param genres: 생성할 장르 목록 (중복은 한 번만 생성)
+        :param with_songs: True이면 가사가 나온 장르부터 노래 생성 작업도 등록합니다
+        :param song_output_dir: 노래를 <song_output_dir>/<장르>/song.mp3로 저장합니다 (기본값: 작업 큐의 기본 경로)
+        """
+        self.genres = list(dict.fromkeys(genres))
+        self.with_songs = with_songs
+        self.suno_api_key = suno_api_key
+        self.song_output_dir = song_output_dir
+        self.pipelines = {
+            genre: GenerationPipeline(
+                recipient, appreciation, min_wc, genre, suno_api_key=suno_api_key,
+                stages=("lyrics",), precomputed={"letter": letter},
+            )
+            for genre in self.genres
+        }
+        self.song_jobs = {}  # 장르 → 노래 작업 id
+        self._events = queue.Queue()
+        self._remaining = len(self.genres) * (2 if with_songs else 1)
+
+    def start(self):
+        """
+        모든 장르의 가사 생성을 시작합니다.
+        :return: self
+        """
+        for genre, pipeline in self.pipelines.items():
+            pipeline.start()
+            pipeline.futures["lyrics"].add_done_callback(lambda future, genre=genre: self._on_lyrics_done(genre, future))
+        return self
+
+    def _on_lyrics_done(self, genre, future):
+        exception = future.exception()
+        result = exception if exception is not None else future.result()
+        self._events.put((genre, "lyrics", result))
+        if not self.with_songs:
+            return
+        title, lyrics = (None, "") if exception is not None else result
+        if not lyrics:
+            self._events.put((genre, "song", RuntimeError("가사가 없어 노래를 생성하지 않았습니다.")))
+            return
+        # Future 완료 콜백에서 난 예외는 로그만 남고 사라지므로, 직접 잡아 노래 결과로 전달해야
+        # events()가 끝나지 않고 기다리는 일이 없습니다.
+        try:
+            output_file = None
+            if self.song_output_dir:
+                genre_dir = os.path.join(self.song_output_dir, genre_slug(genre))
+                os.makedirs(genre_dir, exist_ok=True)
+                output_file = os.path.join(genre_dir, "song.mp3")
+            job_id = submit_song_job(lyrics, title, genre, self.suno_api_key, output_file)
+            self.song_jobs[genre] = job_id
+            add_job_callback(job_id, lambda job, genre=genre: self._events.put((genre, "song", self._song_result(job))))
+        except Exception as e:
+            tracing.record_error(e)
+            self._events.put((genre, "song", e))
+
+    @staticmethod
+    def _song_result(job):
+        if job["status"] == "done":
+            return job["result_path"]
+        return RuntimeError(job["error"] or "노래 생성에 실패했습니다.")
+
+    def partial(self, genre):
+        """
+        생성 중인 가사를 (제목, 지금까지의 가사)로 반환합니다.
+        """
+        return self.pipelines[genre].partial.get("lyrics", (None, ""))
+
+    def lyrics_done(self):
+        return all(p.futures["lyrics"].done() for p in self.pipelines.values())
+
+    def done(self):
+        """
+        모든 결과(가사와, 요청했다면 노래)를 events()/poll()로 받았으면 True입니다.
+        """
+        return self._remaining == 0
+
+    def poll(self):
+        """
+        지금까지 끝난 결과를 기다리지 않고 모두 꺼냅니다 (화면 갱신 루프용).
+        :return: (장르, "lyrics" 또는 "song", 결과 또는 예외) 리스트
+        """
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                self._remaining -= len(events)
+                return events
+
+    def events(self, timeout=None):
+        """
+        가사와 노래가 끝나는 순서대로 (장르, 단계, 결과)를 내보냅니다. 실패한 단계는 결과 대신 예외 객체입니다.
+        :param timeout: 다음 결과를 기다릴 최대 시간(초), 넘으면 queue.Empty
+        """
+        while self._remaining > 0:
+            event = self._events.get(timeout=timeout)
+            self._remaining -= 1
+            yield event
@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import tracing
+
+# 업스트림 API(OpenAI, ElevenLabs, Suno)별로 프로세스 전체에서 공유하는 클라이언트 측 속도 제한기입니다.
+# 분당 요청 수(RPM), 분당 토큰 수(TPM), 동시 요청 수를 토큰 버킷과 세마포어로 제한하며,
+# 한도를 넘는 호출은 실패하지 않고 도착 순서(FIFO)대로 대기합니다.
+
+# 업스트림별 기본 한도 (0이면 제한 없음). 환경 변수 <PROVIDER>_RPM, <PROVIDER>_TPM, <PROVIDER>_MAX_IN_FLIGHT로 조정합니다.
+DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 40000, "max_in_flight": 8},
+    "elevenlabs": {"rpm": 120, "tpm": 0, "max_in_flight": 4},
+    "suno": {"rpm": 30, "tpm": 0, "max_in_flight": 2},
+}
+
+
+def estimate_tokens(messages, max_tokens=0):
+    """
+    프롬프트 길이와 max_tokens로 요청이 쓸 토큰 수를 보수적으로 추정합니다.
+    한글은 글자당 1토큰 이상이 되는 경우가 많아 글자 수를 그대로 토큰 수로 봅니다.
+    :param messages: ChatCompletion 메시지 리스트
+    :param max_tokens: 응답 최대 토큰 수
+    :return: 추정 토큰 수
+    """
+    return sum(len(message.get("content", "")) + 4 for message in messages) + (max_tokens or 0)
+
+
+class _Bucket:
+    # 분당 capacity만큼 채워지는 토큰 버킷
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # 버킷보다 큰 요청은 버킷이 가득 찼을 때 통과시킵니다.
+        needed = min(amount, self.capacity) - self.level
+        return needed / self.rate if needed > 0 else 0.0
+
+
+class ProviderLimiter:
+    """
+    한 업스트림에 대한 RPM/TPM/동시 요청 제한기입니다.
+    """
+
+    def __init__(self, name, rpm=0, tpm=0, max_in_flight=0):
+        self.name = name
+        self._requests = _Bucket(rpm) if rpm else None
+        self._tokens = _Bucket(tpm) if tpm else None
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stats = {"acquired": 0, "waited": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    def _ready_in(self, tokens):
+        # 지금 통과할 수 있으면 0, 아니면 기다려야 할 시간(초). 동시 요청 한도에 걸리면 None.
+        if self.max_in_flight and self._in_flight >= self.max_in_flight:
+            return None
+        now = time.monotonic()
+        delay = 0.0
+        if self._requests is not None:
+            self._requests.refill(now)
+            delay = max(delay, self._requests.wait_time(1))
+        if self._tokens is not None and tokens:
+            self._tokens.refill(now)
+            delay = max(delay, self._tokens.wait_time(tokens))
+        return delay
+
+    def acquire(self, tokens=0):
+        """
+        요청 한 건을 보낼 수 있을 때까지 도착 순서대로 기다립니다.
+        :param tokens: 이 요청이 쓸 것으로 추정되는 토큰 수 (TPM 제한용)
+        :return: 대기한 시간(초)
+        """
+        start = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            while True:
+                delay = self._ready_in(tokens) if self._queue[0] is ticket else None
+                if delay == 0.0:
+                    break
+                self._cond.wait(timeout=delay)
+            self._queue.popleft()
+            if self._requests is not None:
+                self._requests.level -= 1
+            if self._tokens is not None and tokens:
+                self._tokens.level -= min(tokens, self._tokens.capacity)
+            self._in_flight += 1
+
+            waited = time.monotonic() - start
+            self._stats["acquired"] += 1
+            if waited > 0.001:
+                self._stats["waited"] += 1
+            self._stats["total_wait"] += waited
+            self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+            self._cond.notify_all()  # 다음 순서의 대기자가 조건을 다시 확인하도록 깨웁니다
+        return waited
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, tokens=0):
+        """
+        with 블록 동안 요청 한 건의 자리를 차지합니다.
+        """
+        waited = self.acquire(tokens)
+        tracing.add("rate_limit_wait_seconds", waited)  # 한도 때문에 기다린 시간도 span에 남깁니다
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """
+        대기열 길이, 진행 중인 요청 수, 대기 시간 통계를 반환합니다.
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._queue)
+            stats["in_flight"] = self._in_flight
+        stats["avg_wait"] = stats["total_wait"] / stats["acquired"] if stats["acquired"] else 0.0
+        return stats
+
+
+_lock = threading.Lock()
+_limiters = {}
+
+
+def _env_limit(provider, key, default):
+    return int(os.getenv(f"{provider.upper()}_{key.upper()}", str(default)))
+
+
+def get_limiter(provider):
+    """
+    업스트림 이름("openai", "elevenlabs", "suno")에 해당하는 공유 제한기를 반환합니다.
+    """
+    with _lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            defaults = DEFAULT_LIMITS.get(provider, {})
+            limiter = ProviderLimiter(
+                provider,
+                rpm=_env_limit(provider, "rpm", defaults.get("rpm", 0)),
+                tpm=_env_limit(provider, "tpm", defaults.get("tpm", 0)),
+                max_in_flight=_env_limit(provider, "max_in_flight", defaults.get("max_in_flight", 0)),
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def configure_limiter(provider, rpm=None, tpm=None, max_in_flight=None):
+    """
+    업스트림 제한기를 새 한도로 교체합니다. 지정하지 않은 항목은 환경 변수/기본값을 따릅니다.
+    요청이 진행 중이지 않을 때(예: 배치 시작 전) 호출해야 합니다.
+    """
+    defaults = DEFAULT_LIMITS.get(provider, {})
+    limiter = ProviderLimiter(
+        provider,
+        rpm=rpm if rpm is not None else _env_limit(provider, "rpm", defaults.get("rpm", 0)),
+        tpm=tpm if tpm is not None else _env_limit(provider, "tpm", defaults.get("tpm", 0)),
+        max_in_flight=max_in_flight if max_in_flight is not None else _env_limit(provider, "max_in_flight", defaults.get("max_in_flight", 0)),
+    )
+    with _lock:
+        _limiters[provider] = limiter
+    return limiter
+
+
+def limiter_stats():
+    """
+    모든 업스트림 제한기의 통계를 반환합니다.
+    """
+    with _lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+
+tracing.register_gauges("rate_limit", limiter_stats, label="provider")
@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 결과 캐시(cache.py)와 아티팩트 저장소(artifacts.py)가 함께 쓰는 파일 저장 도구입니다.
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    path 옆의 임시 파일 경로를 내주고, 블록이 정상적으로 끝나면 path로 이름을 바꿉니다.
+    실패하면 임시 파일을 지우므로 path에는 항상 완성된 파일만 보입니다.
+    임시 파일 이름에 프로세스 id와 스레드 id를 넣어 여러 프로세스(예: 배치 작업과 앱)가 같은 디렉터리를 써도 겹치지 않습니다.
+    :param path: 최종 파일 경로
+    :return: 임시 파일 경로 (with 블록 안에서 이 경로에 기록)
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def evict_lru(root, max_bytes, low_water, skip_suffixes=(".tmp",), empty_dir_ttl=None):
+    """
+    root 아래 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은(mtime이 오래된) 파일부터 low_water까지 지웁니다.
+    한도보다 조금 아래까지 비워 두므로, 한도 근처에서 쓰기가 이어져도 매번 디렉터리 전체를 다시 훑지 않습니다.
+    :param root: 정리할 디렉터리
+    :param max_bytes: 정리를 시작하는 전체 크기
+    :param low_water: 정리 후 목표 크기
+    :param skip_suffixes: 크기 계산과 삭제에서 제외할 파일 접미사 (쓰는 중인 임시 파일 등)
+    :param empty_dir_ttl: 지정하면 비워진 지 이만큼(초) 지난 하위 디렉터리도 지웁니다
+    :return: (정리 후 전체 크기, 지운 파일의 [(경로, 크기)] 리스트)
+    """
+    entries = []
+    total = 0
+    now = time.time()
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        if empty_dir_ttl is not None and dirpath != root and not dirnames and not filenames:
+            # 방금 만든 디렉터리는 곧 파일이 쓰일 수 있으므로 오래전에 비워진 디렉터리만 지웁니다.
+            try:
+                if now - os.stat(dirpath).st_mtime > empty_dir_ttl:
+                    os.rmdir(dirpath)
+            except OSError:
+                pass
+            continue
+        for name in filenames:
+            if name.endswith(skip_suffixes):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+    evicted = []
+    if total > max_bytes:
+        entries.sort()
+        for _, size, path in entries:
+            if total <= low_water:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted.append((path, size))
+    return total, evicted
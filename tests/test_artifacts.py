@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from artifacts import ArtifactStore, _ArtifactHandler
+from storage import atomic_write
+
+parse_range = _ArtifactHandler._parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=90-200", (90, 99)),
+    ("bytes=-5", (95, 99)),
+    ("bytes=-500", (0, 99)),
+])
+def test_parse_range_satisfiable(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=-0", "bytes=100-", "bytes=50-10", "bytes=-", "items=0-1", "bytes=0-1,5-6"])
+def test_parse_range_unsatisfiable(header):
+    assert parse_range(header, 100) is None
+
+
+def test_atomic_write_replaces_only_on_success(tmp_path):
+    path = tmp_path / "out" / "letter.mp3"
+    with atomic_write(str(path)) as tmp:
+        with open(tmp, "wb") as f:
+            f.write(b"first")
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path)) as tmp:
+            with open(tmp, "wb") as f:
+                f.write(b"partial")
+            raise RuntimeError
+    assert path.read_bytes() == b"first"
+    assert os.listdir(path.parent) == ["letter.mp3"]
+
+
+def test_sweep_evicts_least_recently_used_and_keeps_allocated_dir(tmp_path):
+    store = ArtifactStore(root=str(tmp_path), max_bytes=250, sweep_interval=1)
+    old = store.session_path("a", "old.mp3")
+    new = store.session_path("b", "new.mp3")
+    for path, mtime in ((old, 1000), (new, 2000)):
+        with open(path, "wb") as f:
+            f.write(b"x" * 200)
+        os.utime(path, (mtime, mtime))
+
+    again = store.session_path("a", "old.mp3")
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+    assert os.path.isdir(os.path.dirname(again))
+    assert store.stats()["evictions"] == 1
+
+
+def test_session_path_sanitizes_ids(tmp_path):
+    store = ArtifactStore(root=str(tmp_path))
+    path = store.session_path("../../etc", "letter.mp3")
+    assert store.contains(path)
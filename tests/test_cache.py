@@ -0,0 +1,37 @@
+import os
+
+from cache import ResultCache
+
+
+def _files(root):
+    return sorted(name for _, _, names in os.walk(root) for name in names)
+
+
+def test_writes_leave_no_temporary_files(tmp_path):
+    cache = ResultCache(root=str(tmp_path / "cache"))
+    src = tmp_path / "letter.mp3"
+    src.write_bytes(b"audio")
+
+    cache.set("ab" * 32, {"letter": "고마워요"})
+    cache.put_file("cd" * 32, str(src))
+    out = tmp_path / "out" / "restored.mp3"
+    assert cache.restore_file("cd" * 32, str(out)) == str(out)
+
+    assert out.read_bytes() == b"audio"
+    assert _files(cache.root) == ["ab" * 32 + ".json", "cd" * 32 + ".mp3"]
+    assert _files(out.parent) == ["restored.mp3"]
+    assert ResultCache(root=cache.root).get("ab" * 32) == {"letter": "고마워요"}
+
+
+def test_sweep_evicts_least_recently_used_entries(tmp_path):
+    cache = ResultCache(root=str(tmp_path), max_bytes=385)
+    old, new = "aa" * 32, "bb" * 32
+    for key, mtime in ((old, 1000), (new, 2000)):
+        cache.set(key, "x" * 190)
+        os.utime(cache._path(key, ".json"), (mtime, mtime))
+
+    cache.set("cc" * 32, "y")
+    assert cache.stats()["evictions"] == 1
+    assert not os.path.exists(cache._path(old, ".json"))
+    assert cache.get(old) is None
+    assert cache.get(new) == "x" * 190
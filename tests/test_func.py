@@ -0,0 +1,81 @@
+import pytest
+
+import func
+from func import TitleLyricsParser, _parse_title_lyrics, sniff_audio_format
+
+
+def feed_all(deltas):
+    parser = TitleLyricsParser()
+    events = []
+    for delta in deltas:
+        events.extend(parser.feed(delta))
+    return events, parser.close()
+
+
+def test_parser_emits_title_before_lyrics():
+    events, result = feed_all(["title: 엄마에게\n", "lyrics: [Verse 1]\n", "고마워요"])
+    assert events[0] == ("title", "엄마에게")
+    assert result == ("엄마에게", "[Verse 1]\n고마워요")
+
+
+def test_parser_handles_lyrics_token_split_across_deltas():
+    events, result = feed_all(["title: 노래\nly", "ri", "cs: 첫 줄", " 둘째 줄"])
+    assert [kind for kind, _ in events] == ["title", "lyrics", "lyrics"]
+    assert result == ("노래", "첫 줄 둘째 줄")
+
+
+def test_parser_handles_missing_newline_between_title_and_lyrics():
+    events, result = feed_all(["title: 감사 lyr", "ics: 가사"])
+    assert events == [("title", "감사"), ("lyrics", "가사")]
+    assert result == ("감사", "가사")
+
+
+def test_parser_without_lyrics_raises():
+    parser = TitleLyricsParser()
+    parser.feed("title: 제목만\n")
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_parse_title_lyrics():
+    assert _parse_title_lyrics("title: 제목\nlyrics: 가사") == ("제목", "가사")
+    with pytest.raises(ValueError):
+        _parse_title_lyrics("가사만 있습니다")
+
+
+@pytest.mark.parametrize("head, content_type, expected", [
+    (b"ID3\x04\x00\x00\x00\x00\x00\x00", "", "mp3"),
+    (b"\xff\xfb\x90\x64", "", "mp3"),
+    (b"\xff\xf1\x50\x80", "", "aac"),
+    (b"\xff\xf9\x50\x80", "audio/mpeg", "aac"),
+    (b"RIFF\x00\x00\x00\x00WAVEfmt ", "", "wav"),
+    (b"OggS\x00\x02", "", "ogg"),
+    (b"fLaC\x00\x00", "", "flac"),
+    (b"\x00\x00\x00\x20ftypM4A ", "", "mp4"),
+    (b"\x00\x01\x02\x03", "audio/mpeg; charset=binary", "mp3"),
+    (b"\x00\x01\x02\x03", "application/octet-stream", None),
+])
+def test_sniff_audio_format(head, content_type, expected):
+    assert sniff_audio_format(head, content_type) == expected
+
+
+def test_summarize_letter_memoizes_in_process_when_cache_disabled(monkeypatch):
+    calls = []
+
+    class Message:
+        content = " 요약 "
+
+    class Response:
+        choices = [type("Choice", (), {"message": Message})]
+
+    def fake_completion(request):
+        calls.append(request)
+        return Response
+
+    monkeypatch.setattr(func, "CACHE_ENABLED", False)
+    monkeypatch.setattr(func, "_chat_completion", fake_completion)
+    monkeypatch.setattr(func.result_cache, "set", lambda *args: pytest.fail("result_cache에 쓰면 안 됩니다"))
+    letter = "고마워요. " * func.LETTER_SUMMARY_MIN_CHARS
+    assert func.summarize_letter(letter) == "요약"
+    assert func.summarize_letter(letter) == "요약"
+    assert len(calls) == 1
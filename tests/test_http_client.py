@@ -0,0 +1,141 @@
+import io
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+
+# 테스트에서는 대기 없이 재시도하도록 바꾸므로 원래 함수를 따로 보관합니다.
+_backoff_delay = http_client._backoff_delay
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # keep-alive 재사용을 확인할 수 있도록 HTTP/1.1로 응답합니다.
+    protocol_version = "HTTP/1.1"
+    # 본문이 Content-Length보다 짧게 오면 테스트가 멈추지 않고 실패하도록 합니다.
+    timeout = 2
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.server.bodies.append(self.rfile.read(length))
+        statuses = self.server.statuses
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        body = b"ok" if status == 200 else b"error"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    """
+    응답 상태 코드를 순서대로 돌려주는 로컬 HTTP 서버입니다.
+    마지막 상태 코드는 이후 요청에도 계속 사용됩니다.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.statuses = [200]
+    server.bodies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "_backoff_delay", lambda attempt, response=None: 0)
+    http_client.close_all()
+    yield
+    http_client.close_all()
+
+
+def _host_stats(url):
+    return http_client.pool_stats()[http_client._host_key(url)]
+
+
+def test_retries_server_errors_then_succeeds(stub):
+    stub.statuses = [500, 502, 200]
+    response = http_client.get(stub.url)
+    assert response.status_code == 200
+    stats = _host_stats(stub.url)
+    assert (stats["requests"], stats["retries"], stats["failures"]) == (3, 2, 0)
+
+
+@pytest.mark.parametrize("idempotent, attempts", [(True, 4), (False, 1)])
+def test_500_is_retried_only_for_idempotent_requests(stub, idempotent, attempts):
+    stub.statuses = [500]
+    response = http_client.post(stub.url, data=b"song", idempotent=idempotent, max_retries=3)
+    assert response.status_code == 500
+    assert len(stub.bodies) == attempts
+    assert _host_stats(stub.url)["failures"] == 1
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_non_idempotent_retries_statuses_that_were_not_processed(stub, status):
+    stub.statuses = [status, 200]
+    response = http_client.post(stub.url, data=b"song", idempotent=False)
+    assert response.status_code == 200
+    assert len(stub.bodies) == 2
+
+
+def test_non_idempotent_retries_connect_errors():
+    # 닫힌 포트로의 연결 거부는 요청이 서버에 닿지 않았으므로 멱등이 아니어도 재시도합니다.
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    sock.close()
+    with pytest.raises(http_client.requests.exceptions.ConnectionError):
+        http_client.post(url, data=b"song", idempotent=False, max_retries=2)
+    stats = _host_stats(url)
+    assert (stats["requests"], stats["retries"], stats["failures"]) == (3, 2, 1)
+
+
+def test_multipart_stream_is_replayed_on_retry(stub):
+    stub.statuses = [503, 200]
+    stream = http_client.MultipartStream({"name": "엄마"}, "files", io.BytesIO(b"voice-bytes"), "voice.mp3")
+    response = http_client.post(
+        stub.url, data=stream, headers={"Content-Type": stream.content_type}, idempotent=False
+    )
+    assert response.status_code == 200
+    assert len(stub.bodies) == 2
+    assert stub.bodies[0] == stub.bodies[1]
+    assert b"voice-bytes" in stub.bodies[1]
+    assert len(stub.bodies[1]) == len(stream)
+
+
+def test_files_are_rewound_on_retry(stub):
+    stub.statuses = [503, 200]
+    files = {"files": ("voice.mp3", io.BytesIO(b"voice-bytes"), "audio/mpeg")}
+    http_client.post(stub.url, files=files)
+    assert b"voice-bytes" in stub.bodies[0]
+    assert b"voice-bytes" in stub.bodies[1]
+
+
+def test_pool_stats_reports_keep_alive_reuse(stub):
+    for _ in range(3):
+        http_client.get(stub.url).close()
+    stats = _host_stats(stub.url)
+    assert stats["requests"] == 3
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 2
+    assert stats["avg_time"] > 0
+
+
+def test_backoff_prefers_retry_after(monkeypatch):
+    class Response:
+        headers = {"Retry-After": "2"}
+
+    monkeypatch.setattr(http_client, "BACKOFF_MAX", 10)
+    assert _backoff_delay(0, Response()) == 2
+    assert 0 <= _backoff_delay(3) <= http_client.BACKOFF_BASE * 8
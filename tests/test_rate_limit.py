@@ -0,0 +1,64 @@
+import threading
+import time
+
+from rate_limit import ProviderLimiter
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "조건이 시간 안에 만족되지 않았습니다"
+        time.sleep(0.005)
+
+
+def test_waiters_acquire_in_arrival_order():
+    limiter = ProviderLimiter("test", max_in_flight=1)
+    order = []
+    limiter.acquire()
+
+    def worker(i):
+        with limiter.slot():
+            order.append(i)
+
+    threads = []
+    for i in range(5):
+        thread = threading.Thread(target=worker, args=(i,))
+        thread.start()
+        threads.append(thread)
+        # 다음 스레드를 시작하기 전에 이 스레드가 대기열에 들어갔는지 확인해 도착 순서를 고정합니다.
+        wait_until(lambda: limiter.stats()["queued"] == i + 1)
+    limiter.release()
+    for thread in threads:
+        thread.join(timeout=2)
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_oversized_request_waits_for_a_full_bucket():
+    limiter = ProviderLimiter("test", tpm=6000)  # 초당 100토큰
+    assert limiter.acquire(tokens=20) < 0.01
+    limiter.release()
+    # 버킷(6000)보다 큰 요청은 영원히 기다리지 않고, 쓴 20토큰이 다시 찰 때(약 0.2초)까지만 기다립니다.
+    waited = limiter.acquire(tokens=10 ** 6)
+    limiter.release()
+    assert 0.15 < waited < 1.0
+    assert limiter._tokens.level < 10
+
+
+def test_stats_account_for_waits():
+    limiter = ProviderLimiter("test", max_in_flight=1)
+    limiter.acquire()
+    thread = threading.Thread(target=limiter.acquire)
+    thread.start()
+    wait_until(lambda: limiter.stats()["queued"] == 1)
+    time.sleep(0.2)
+    limiter.release()
+    thread.join(timeout=2)
+
+    stats = limiter.stats()
+    assert stats["acquired"] == 2
+    assert stats["waited"] == 1
+    assert stats["queued"] == 0
+    assert stats["in_flight"] == 1
+    assert 0.2 <= stats["max_wait"] < 1.0
+    assert stats["total_wait"] >= stats["max_wait"]
+    assert stats["avg_wait"] == stats["total_wait"] / 2
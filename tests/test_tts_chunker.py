@@ -0,0 +1,29 @@
+from tts_chunker import chunk_text, split_sentences
+
+
+def test_split_sentences_keeps_korean_punctuation_and_quotes():
+    text = "고마워요. 정말요?! 그때 \"괜찮아.\" 라고 하셨죠…\n마지막 줄"
+    assert split_sentences(text) == ["고마워요.", "정말요?!", "그때 \"괜찮아.\"", "라고 하셨죠…", "마지막 줄"]
+
+
+def test_chunk_text_packs_sentences_up_to_max_chars():
+    text = "가나다. 라마바. 사아자. 차카타."
+    assert chunk_text(text, 9) == ["가나다. 라마바.", "사아자. 차카타."]
+
+
+def test_chunk_text_short_text_is_single_chunk():
+    assert chunk_text("짧은 편지입니다.", 500) == ["짧은 편지입니다."]
+    assert chunk_text("", 500) == []
+
+
+def test_chunk_text_splits_long_sentence_at_commas_then_spaces():
+    sentence = "어릴 적부터, 늘 곁에서 웃어 주시던 모습이 떠오릅니다."
+    chunks = chunk_text(sentence, 12)
+    assert all(len(chunk) <= 12 for chunk in chunks)
+    assert chunks[0] == "어릴 적부터,"
+    assert " ".join(chunks).replace("  ", " ") == sentence
+
+
+def test_chunk_text_hard_cuts_words_longer_than_max_chars():
+    chunks = chunk_text("가" * 25, 10)
+    assert chunks == ["가" * 10, "가" * 10, "가" * 5]
@@ -0,0 +1,497 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 생성 단계별 소요 시간을 span으로 기록하는 가벼운 계측 모듈입니다.
+# span에는 요청(세션/배치 행)별 correlation id, TTFB, 전체 시간, 바이트 수, 재시도/캐시 적중 횟수가 담기고,
+# 끝난 span은 이름별 지표(Prometheus 텍스트/OpenMetrics)로 집계되며 JSON 줄 로그로도 남길 수 있습니다.
+# TRACING_ENABLED=1일 때만 동작하며, 꺼져 있으면 전역 변수 하나만 확인하고 원래 함수를 그대로 호출합니다.
+
+ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")  # 설정하면 끝난 span을 JSON 줄로 기록합니다
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "1000"))  # 메모리에 보관할 최근 span 수
+METRICS_PORT = os.getenv("METRICS_PORT")  # 설정하면 start_metrics_server()가 /metrics를 엽니다
+# /spans는 span 속성을 인증 없이 보여 주므로 기본값은 이 컴퓨터에서만 접근 가능한 주소입니다.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRIC_PREFIX = "melodygram"
+
+# 소요 시간 히스토그램 구간(초). Suno 생성처럼 수 분 걸리는 단계까지 담을 수 있게 잡았습니다.
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_lock = threading.Lock()
+_metrics = {}  # span 이름 → 집계 dict
+_recent = deque(maxlen=TRACE_BUFFER_SIZE)
+_gauges = {}  # 이름 → (게이지 수집 함수, 라벨 이름), register_gauges()로 등록
+_log_file = None
+_server = None
+
+
+def enable(enabled=True):
+    """
+    실행 중에 계측을 켜거나 끕니다 (벤치마크나 디버깅용).
+    """
+    global ENABLED
+    ENABLED = enabled
+
+
+def new_correlation_id():
+    return uuid.uuid4().hex[:16]
+
+
+def get_correlation_id():
+    return _correlation_id.get()
+
+
+def set_correlation_id(correlation_id):
+    """
+    현재 컨텍스트(스레드/Streamlit 실행)의 correlation id를 설정합니다.
+    이후 시작하는 span과, propagate()로 넘긴 작업의 span에 이 id가 붙습니다.
+    :return: contextvars 토큰
+    """
+    return _correlation_id.set(correlation_id)
+
+
+def propagate(fn):
+    """
+    현재 컨텍스트(correlation id, 부모 span)를 복사해 다른 스레드에서 fn을 실행하도록 감쌉니다.
+    스레드 풀에 작업을 넘길 때 사용합니다 (예: executor.submit(propagate(fn), ...)).
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        # 같은 Context는 여러 스레드에서 동시에 실행할 수 없으므로 호출마다 복사본을 씁니다.
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+class Span:
+    """
+    한 단계의 실행 기록입니다. with 문으로 열고 닫습니다.
+    """
+
+    __slots__ = ("name", "span_id", "parent_id", "correlation_id", "attrs", "counters",
+                 "error", "started_at", "ttfb", "duration", "_start", "_tokens")
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = None
+        self.correlation_id = None
+        self.attrs = dict(attrs or {})
+        self.counters = {}
+        self.error = None
+        self.started_at = None
+        self.ttfb = None
+        self.duration = None
+        self._start = None
+        self._tokens = None
+
+    def start(self):
+        # 부모 span과 correlation id를 정하고 시간을 재기 시작합니다 (컨텍스트는 바꾸지 않음).
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        # correlation id 없이 시작한 최상위 span은 새 id를 만들어 하위 span과 공유합니다.
+        self.correlation_id = _correlation_id.get() or new_correlation_id()
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def _activate(self):
+        # 이 span을 현재 span으로 설정하고, 되돌릴 때 쓸 (변수, 토큰) 리스트를 반환합니다.
+        tokens = [(_current_span, _current_span.set(self))]
+        if _correlation_id.get() is None:
+            tokens.append((_correlation_id, _correlation_id.set(self.correlation_id)))
+        return tokens
+
+    def __enter__(self):
+        self.start()
+        self._tokens = self._activate()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Streamlit의 st.rerun()처럼 BaseException으로 흐름을 제어하는 경우는 오류로 보지 않습니다.
+        if isinstance(exc, Exception):
+            self.record_error(exc)
+        for var, token in reversed(self._tokens):
+            var.reset(token)
+        self.finish()
+        return False
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def add(self, key, amount=1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def first_byte(self):
+        # 첫 응답 바이트(또는 첫 토큰)가 도착한 시점을 한 번만 기록합니다.
+        if self.ttfb is None and self._start is not None:
+            self.ttfb = time.perf_counter() - self._start
+
+    def record_error(self, exc):
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def finish(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        _record(self)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "correlation_id": self.correlation_id,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "ttfb": self.ttfb,
+            "error": self.error,
+            "attrs": self.attrs,
+            "counters": self.counters,
+        }
+
+
+class _NoopSpan:
+    # 계측이 꺼져 있을 때 돌려주는 span (모든 동작이 아무 일도 하지 않음)
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+    def first_byte(self):
+        pass
+
+    def record_error(self, exc):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, **attrs):
+    """
+    with 문으로 사용할 span을 만듭니다. 계측이 꺼져 있으면 아무 일도 하지 않는 span을 반환합니다.
+    예: with tracing.span("pipeline.tts", voice_id=voice_id) as s: ...
+    """
+    if not ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def current_span():
+    """
+    지금 실행 중인 span을 반환합니다 (없거나 계측이 꺼져 있으면 아무 일도 하지 않는 span).
+    """
+    if not ENABLED:
+        return _NOOP
+    return _current_span.get() or _NOOP
+
+
+def add(key, amount=1):
+    """
+    현재 span의 카운터를 올립니다 (예: "retries", "cache_hits", "bytes").
+    """
+    if ENABLED:
+        current = _current_span.get()
+        if current is not None:
+            current.add(key, amount)
+
+
+def record_error(exc):
+    """
+    예외를 잡아서 처리하는 코드에서 현재 span에 오류를 기록합니다.
+    """
+    if ENABLED:
+        current = _current_span.get()
+        if current is not None:
+            current.record_error(exc)
+
+
+def traced(name=None):
+    """
+    함수 호출을 span으로 감싸는 데코레이터입니다. span 이름의 기본값은 "모듈.함수"입니다.
+    제너레이터 함수는 소비가 끝날 때까지를 한 span으로 기록하고, 첫 항목이 나온 시점을 TTFB로,
+    bytes 항목의 길이 합을 "bytes", 나머지 항목 수를 "items" 카운터로 기록합니다.
+    """
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__name__}"
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                if not ENABLED:
+                    return (yield from fn(*args, **kwargs))
+                return (yield from _traced_generator(span_name, fn(*args, **kwargs)))
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with Span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def _traced_generator(span_name, generator):
+    # 제너레이터는 소비하는 쪽과 번갈아 실행되므로, 항목을 하나 만들 때마다 span을 현재 span으로 잠시 설정합니다.
+    # (yield 중에 span이 현재 span으로 남아 있으면 소비하는 쪽의 작업이 이 span의 하위로 잘못 기록됩니다)
+    current = Span(span_name).start()
+    try:
+        while True:
+            tokens = current._activate()
+            try:
+                item = next(generator)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                for var, token in reversed(tokens):
+                    var.reset(token)
+            current.first_byte()
+            if isinstance(item, (bytes, bytearray)):
+                current.add("bytes", len(item))
+            else:
+                current.add("items")
+            yield item
+    except Exception as e:
+        current.record_error(e)
+        raise
+    finally:
+        generator.close()
+        current.finish()
+
+
+def _new_metric():
+    return {
+        "count": 0,
+        "errors": 0,
+        "duration_sum": 0.0,
+        "buckets": [0] * len(DURATION_BUCKETS),
+        "ttfb_sum": 0.0,
+        "ttfb_count": 0,
+        "counters": {},
+    }
+
+
+def _record(finished):
+    with _lock:
+        metric = _metrics.get(finished.name)
+        if metric is None:
+            metric = _metrics[finished.name] = _new_metric()
+        metric["count"] += 1
+        metric["duration_sum"] += finished.duration
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if finished.duration <= bound:
+                metric["buckets"][index] += 1
+        if finished.error is not None:
+            metric["errors"] += 1
+        if finished.ttfb is not None:
+            metric["ttfb_sum"] += finished.ttfb
+            metric["ttfb_count"] += 1
+        for key, value in finished.counters.items():
+            metric["counters"][key] = metric["counters"].get(key, 0) + value
+        _recent.append(finished)
+        if TRACE_LOG_PATH:
+            _write_log(finished)
+
+
+def _write_log(finished):
+    # _lock을 잡은 상태에서 호출됩니다.
+    global _log_file
+    try:
+        if _log_file is None:
+            directory = os.path.dirname(TRACE_LOG_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            _log_file = open(TRACE_LOG_PATH, "a", encoding="utf-8")
+        _log_file.write(json.dumps(finished.to_dict(), ensure_ascii=False, default=str) + "\n")
+        _log_file.flush()
+    except OSError as e:
+        print(f"span 로그 기록 중 오류 발생: {e}")
+
+
+def recent_spans(limit=None, correlation_id=None):
+    """
+    최근에 끝난 span을 dict 리스트로 반환합니다.
+    :param limit: 최대 개수 (최근 것부터)
+    :param correlation_id: 지정하면 해당 요청의 span만 반환합니다
+    """
+    with _lock:
+        spans = list(_recent)
+    if correlation_id is not None:
+        spans = [s for s in spans if s.correlation_id == correlation_id]
+    if limit is not None:
+        spans = spans[-limit:]
+    return [s.to_dict() for s in spans]
+
+
+def metrics_snapshot():
+    """
+    span 이름별 집계를 복사해 반환합니다.
+    """
+    with _lock:
+        return {
+            name: dict(metric, buckets=list(metric["buckets"]), counters=dict(metric["counters"]))
+            for name, metric in _metrics.items()
+        }
+
+
+def reset():
+    """
+    집계와 최근 span 기록을 모두 지웁니다.
+    """
+    with _lock:
+        _metrics.clear()
+        _recent.clear()
+
+
+def register_gauges(name, collect, label=None):
+    """
+    /metrics에 함께 내보낼 게이지 수집 함수를 등록합니다 (작업 큐 깊이, 캐시/속도 제한기 통계 등).
+    같은 이름으로 다시 등록하면 덮어씁니다.
+    :param name: 지표 이름 접두사 (예: "song_jobs" → melodygram_song_jobs_queue_depth)
+    :param collect: {지표: 숫자}를 반환하는 함수. label을 주면 {라벨 값: {지표: 숫자}}를 반환해야 합니다
+    :param label: 라벨 이름 (예: "provider")
+    """
+    with _lock:
+        _gauges[name] = (collect, label)
+
+
+def _gauge_lines():
+    with _lock:
+        gauges = sorted(_gauges.items())
+    series = {}  # 지표 이름 → [(라벨, 값)]
+    for name, (collect, label) in gauges:
+        try:
+            collected = collect()
+        except Exception:
+            continue  # 수집 실패가 /metrics 전체를 막지 않도록 건너뜁니다
+        groups = collected.items() if label else [(None, collected)]
+        for label_value, values in groups:
+            labels = f'{{{label}="{_label(label_value)}"}}' if label else ""
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    series.setdefault(f"{METRIC_PREFIX}_{name}_{key}", []).append((labels, value))
+    lines = []
+    for metric, values in sorted(series.items()):
+        lines.append(f"# TYPE {metric} gauge")
+        lines += [f"{metric}{labels} {value}" for labels, value in values]
+    return lines
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def export_metrics(openmetrics=False):
+    """
+    집계된 지표와 register_gauges()로 등록된 게이지를 Prometheus 텍스트 형식(openmetrics=True이면 OpenMetrics 형식)으로 반환합니다.
+    """
+    snapshot = metrics_snapshot()
+    duration = f"{METRIC_PREFIX}_span_duration_seconds"
+    ttfb = f"{METRIC_PREFIX}_span_ttfb_seconds"
+    errors = f"{METRIC_PREFIX}_span_errors"
+    events = f"{METRIC_PREFIX}_span_events"
+    lines = [
+        f"# HELP {duration} Span duration in seconds.",
+        f"# TYPE {duration} histogram",
+    ]
+    for name, metric in sorted(snapshot.items()):
+        label = f'span="{_label(name)}"'
+        for bound, count in zip(DURATION_BUCKETS, metric["buckets"]):
+            lines.append(f'{duration}_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'{duration}_bucket{{{label},le="+Inf"}} {metric["count"]}')
+        lines.append(f"{duration}_sum{{{label}}} {metric['duration_sum']}")
+        lines.append(f"{duration}_count{{{label}}} {metric['count']}")
+
+    lines += [f"# HELP {ttfb} Time to first byte or token in seconds.", f"# TYPE {ttfb} summary"]
+    for name, metric in sorted(snapshot.items()):
+        if metric["ttfb_count"]:
+            label = f'span="{_label(name)}"'
+            lines.append(f"{ttfb}_sum{{{label}}} {metric['ttfb_sum']}")
+            lines.append(f"{ttfb}_count{{{label}}} {metric['ttfb_count']}")
+
+    lines += [f"# HELP {errors} Spans that ended with an error.", f"# TYPE {errors} counter"]
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f'{errors}_total{{span="{_label(name)}"}} {metric["errors"]}')
+
+    lines += [f"# HELP {events} Span counters such as bytes, retries and cache hits.", f"# TYPE {events} counter"]
+    for name, metric in sorted(snapshot.items()):
+        for key, value in sorted(metric["counters"].items()):
+            lines.append(f'{events}_total{{span="{_label(name)}",event="{_label(key)}"}} {value}')
+
+    lines += _gauge_lines()
+
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+            body = export_metrics(openmetrics).encode("utf-8")
+            content_type = (
+                "application/openmetrics-text; version=1.0.0; charset=utf-8" if openmetrics
+                else "text/plain; version=0.0.4; charset=utf-8"
+            )
+        elif self.path.split("?")[0] == "/spans":
+            body = json.dumps(recent_spans(200), ensure_ascii=False, default=str).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port=None, host=None):
+    """
+    /metrics(Prometheus/OpenMetrics)와 /spans(최근 span JSON)를 제공하는 HTTP 서버를 백그라운드에서 엽니다.
+    여러 번 호출해도 한 번만 열리며, port와 METRICS_PORT가 모두 없으면 아무 일도 하지 않습니다.
+    :param host: 서버가 받을 주소 (기본값: METRICS_HOST)
+    :return: 서버 포트 또는 None
+    """
+    global _server
+    port = port if port is not None else METRICS_PORT
+    if port is None:
+        return None
+    host = host if host is not None else METRICS_HOST
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server.server_address[1]
@@ -0,0 +1,79 @@
+import re
+import shutil
+
+# 긴 편지를 TTS 요청 단위로 나누고, 합성된 MP3 조각을 순서대로 이어 붙이는 도구입니다.
+
+# 문장: 마침표/물음표/느낌표/말줄임표(전각 포함)와 뒤따르는 닫는 따옴표·괄호까지, 또는 줄 끝까지
+_SENTENCE = re.compile(r'[^\n]*?[.!?…。！？]+["\'”’)\]]*(?=\s|$)|[^\n]+')
+# 문장이 너무 길 때 나눌 수 있는 위치 (쉼표, 쌍점, 쌍반점 뒤)
+_CLAUSE_END = re.compile(r'(?<=[,，、;:])\s+')
+
+
+def split_sentences(text):
+    """
+    한국어 문장 부호를 고려해 텍스트를 문장 단위로 나눕니다.
+    :param text: 나눌 텍스트
+    :return: 공백을 정리한 문장 리스트
+    """
+    return [sentence.strip() for sentence in _SENTENCE.findall(text) if sentence.strip()]
+
+
+def _split_long_sentence(sentence, max_chars):
+    # 한 문장이 max_chars를 넘으면 쉼표 뒤, 그래도 길면 공백 위치에서 자릅니다.
+    pieces = []
+    for clause in _CLAUSE_END.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if clause:
+            pieces.append(clause)
+    return pieces
+
+
+def chunk_text(text, max_chars):
+    """
+    문장 경계를 지키면서 각 조각이 max_chars 이하가 되도록 텍스트를 묶습니다.
+    :param text: 나눌 텍스트
+    :param max_chars: 조각당 최대 글자 수
+    :return: 텍스트 조각 리스트 (원래 순서 유지)
+    """
+    chunks = []
+    current = ""
+    for sentence in split_sentences(text):
+        pieces = [sentence] if len(sentence) <= max_chars else _split_long_sentence(sentence, max_chars)
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _id3v2_size(head):
+    # ID3v2 태그 길이 (헤더 10바이트 + 본문 + 선택적 푸터)
+    if len(head) < 10 or not head.startswith(b"ID3"):
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def concat_mp3(part_files, output_file, chunk_size=64 * 1024):
+    """
+    MP3 조각 파일들을 재인코딩 없이 순서대로 이어 붙입니다.
+    두 번째 조각부터는 ID3v2 태그를 건너뛰어 프레임만 이어지도록 합니다.
+    :param part_files: 순서대로 정렬된 MP3 조각 경로 리스트
+    :param output_file: 결과 파일 경로
+    """
+    with open(output_file, "wb") as out:
+        for index, part in enumerate(part_files):
+            with open(part, "rb") as f:
+                if index > 0:
+                    f.seek(_id3v2_size(f.read(10)))
+                shutil.copyfileobj(f, out, chunk_size)
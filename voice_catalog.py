@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+
+import http_client
+from rate_limit import get_limiter
+
+# ElevenLabs 음성 목록을 한 번 받아 캐시하고, 성별/언어/라벨로 색인해 바로 찾을 수 있게 하는 카탈로그입니다.
+# TTL이 지나면 기존 목록을 그대로 쓰면서 백그라운드에서 ETag로 재검증(If-None-Match)하고,
+# 음성 선택은 항상 카탈로그에 실제로 있는 ID만 돌려주도록 검증합니다.
+
+VOICE_CATALOG_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io") + "/v1/voices"
+VOICE_CATALOG_TTL = float(os.getenv("VOICE_CATALOG_TTL", "3600"))
+DEFAULT_LANGUAGE = os.getenv("VOICE_DEFAULT_LANGUAGE", "ko")
+DEFAULT_GENDER = "여성"
+FETCH_RETRY_INTERVAL = 60  # 목록을 받지 못했을 때 다시 시도하기까지의 시간(초)
+
+# 성별별로 우선 사용할 음성 ID (카탈로그에 있으면 이 ID를 고르고, 카탈로그를 받을 수 없을 때의 대비책으로도 사용)
+PREFERRED_VOICES = {
+    "여성": "Xb7hH8MSUJpSbSDYk0k2",
+    "남성": "JBFqnCBsd6RMkjVDRZzb",
+}
+
+# 화면의 성별 선택값 → ElevenLabs 라벨 값
+GENDER_LABELS = {
+    "여성": "female",
+    "남성": "male",
+}
+
+
+def _voice_languages(voice):
+    # 라벨의 language와 verified_languages 항목을 모두 언어로 인정합니다.
+    languages = set()
+    labels = voice.get("labels") or {}
+    if labels.get("language"):
+        languages.add(labels["language"].lower())
+    for entry in voice.get("verified_languages") or []:
+        if entry.get("language"):
+            languages.add(entry["language"].lower())
+    return languages
+
+
+class VoiceCatalog:
+    """
+    ElevenLabs 음성 목록 캐시와 색인입니다.
+    """
+
+    def __init__(self, url=VOICE_CATALOG_URL, ttl=VOICE_CATALOG_TTL):
+        self.url = url
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._etag = None
+        self._fetched_at = 0.0
+        self._failed_at = None
+        self._by_id = {}
+        self._by_label = {}  # (라벨 이름, 값) → voice_id 튜플
+        self._by_gender_language = {}  # (성별 라벨, 언어) → voice_id 튜플
+
+    def _fetch(self):
+        headers = {"xi-api-key": os.getenv("ELEVENLABS_API_KEY")}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        with get_limiter("elevenlabs").slot():
+            response = http_client.get(self.url, headers=headers)
+        if response.status_code == 304:
+            with self._lock:
+                self._fetched_at = time.monotonic()
+            return
+        response.raise_for_status()
+        self._build_index(response.json().get("voices", []), response.headers.get("ETag"))
+
+    def _build_index(self, voices, etag=None):
+        # 이름과 ID 순으로 정렬해 같은 목록이면 항상 같은 음성이 선택되도록 합니다.
+        voices = sorted(voices, key=lambda v: (v.get("name") or "", v["voice_id"]))
+        by_id = {}
+        by_label = {}
+        by_gender_language = {}
+        for voice in voices:
+            voice_id = voice["voice_id"]
+            by_id[voice_id] = voice
+            labels = voice.get("labels") or {}
+            for key, value in labels.items():
+                if value:
+                    by_label.setdefault((key, str(value).lower()), []).append(voice_id)
+            gender = (labels.get("gender") or "").lower()
+            for language in _voice_languages(voice) or {""}:
+                by_gender_language.setdefault((gender, language), []).append(voice_id)
+        with self._lock:
+            self._by_id = by_id
+            self._by_label = {key: tuple(ids) for key, ids in by_label.items()}
+            self._by_gender_language = {key: tuple(ids) for key, ids in by_gender_language.items()}
+            self._etag = etag
+            self._fetched_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._fetch()
+            except Exception as e:
+                print(f"음성 목록 갱신 중 오류 발생: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="voice-catalog-refresh", daemon=True).start()
+
+    def ensure_loaded(self):
+        """
+        처음에는 목록을 받아올 때까지 기다리고, 이후 TTL이 지나면 백그라운드에서 갱신합니다.
+        :return: 카탈로그를 사용할 수 있으면 True
+        """
+        with self._lock:
+            loaded = bool(self._by_id)
+            stale = time.monotonic() - self._fetched_at > self.ttl
+        if not loaded:
+            # 실패 직후에는 매 호출마다 왕복하지 않도록 잠시 기본 음성을 사용합니다.
+            if self._failed_at is not None and time.monotonic() - self._failed_at < FETCH_RETRY_INTERVAL:
+                return False
+            try:
+                self._fetch()
+            except Exception as e:
+                print(f"음성 목록을 가져오는 중 오류 발생: {e}")
+                self._failed_at = time.monotonic()
+                return False
+            with self._lock:
+                return bool(self._by_id)
+        if stale:
+            self._refresh_in_background()
+        return True
+
+    def voices(self):
+        """
+        캐시된 음성 목록을 이름순으로 반환합니다.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            return list(self._by_id.values())
+
+    def get(self, voice_id):
+        """
+        :return: 음성 정보 dict 또는 None
+        """
+        self.ensure_loaded()
+        with self._lock:
+            return self._by_id.get(voice_id)
+
+    def find(self, label, value):
+        """
+        라벨 값으로 음성 ID를 찾습니다 (예: find("accent", "korean")).
+        :return: voice_id 튜플
+        """
+        self.ensure_loaded()
+        with self._lock:
+            return self._by_label.get((label, str(value).lower()), ())
+
+    def select_voice(self, gender, language=DEFAULT_LANGUAGE):
+        """
+        성별과 언어에 맞는 음성 ID를 결정적으로 고릅니다. 반환값은 항상 카탈로그에 있는 ID이며,
+        카탈로그를 받을 수 없을 때만 미리 정해 둔 기본 음성 ID를 반환합니다.
+        :param gender: 성별 ("남성" 또는 "여성", 그 외 값은 기본 성별로 처리)
+        :param language: 언어 코드 (기본값: "ko")
+        :return: 음성 ID
+        """
+        if gender not in GENDER_LABELS:
+            gender = DEFAULT_GENDER
+        preferred = PREFERRED_VOICES[gender]
+        if not self.ensure_loaded():
+            return preferred
+
+        label = GENDER_LABELS[gender]
+        with self._lock:
+            if preferred in self._by_id:
+                return preferred
+            # 성별+언어 → 성별(언어 무관) → 전체 목록 순으로 찾습니다.
+            candidates = self._by_gender_language.get((label, language.lower()))
+            if not candidates:
+                candidates = self._by_label.get(("gender", label))
+            if not candidates:
+                candidates = tuple(self._by_id)
+            return candidates[0]
+
+
+# 프로세스 전체에서 공유하는 기본 카탈로그
+voice_catalog = VoiceCatalog()
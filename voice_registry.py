@@ -0,0 +1,146 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from func import delete_user_voice, upload_user_voice
+from locks import striped_lock
+
+# 업로드한 음성 파일의 내용 해시로 ElevenLabs voice_id를 기억하는 로컬 레지스트리입니다.
+# 같은 녹음을 다시 올리면 복제(/v1/voices/add) 없이 기존 voice_id를 바로 돌려주고,
+# 오랫동안 쓰이지 않은 음성은 ElevenLabs에서 삭제해 음성 슬롯을 확보합니다.
+
+VOICE_REGISTRY_PATH = os.getenv("VOICE_REGISTRY_PATH", os.path.join(".cache", "voices.sqlite3"))
+VOICE_MAX_IDLE_DAYS = float(os.getenv("VOICE_MAX_IDLE_DAYS", "30"))
+VOICE_GC_INTERVAL = float(os.getenv("VOICE_GC_INTERVAL", "3600"))  # 초
+
+_lock = threading.Lock()
+_hash_locks = [threading.Lock() for _ in range(64)]  # 해시별 잠금 (striped_lock 참고)
+_last_gc = 0.0
+
+
+@contextmanager
+def _connect(path=VOICE_REGISTRY_PATH):
+    # 호출마다 연결을 열고, 블록이 끝나면 커밋 후 닫습니다 (스레드 간 연결 공유 방지).
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS voices ("
+                " content_hash TEXT PRIMARY KEY,"
+                " voice_id TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used_at REAL NOT NULL)"
+            )
+            yield conn
+    finally:
+        conn.close()
+
+
+def hash_audio(fileobj, chunk_size=64 * 1024):
+    """
+    파일 객체를 조금씩 읽어 SHA-256 해시를 계산하고, 읽기 위치를 원래대로 되돌립니다.
+    :param fileobj: 읽기 가능하고 seek 가능한 바이너리 파일 객체
+    :return: 16진수 해시 문자열
+    """
+    start = fileobj.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(start)
+    return digest.hexdigest()
+
+
+def lookup_voice(content_hash):
+    """
+    해시에 해당하는 voice_id를 찾고 마지막 사용 시각을 갱신합니다.
+    :return: voice_id 또는 None
+    """
+    with _connect() as conn:
+        row = conn.execute("SELECT voice_id FROM voices WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE voices SET last_used_at = ? WHERE content_hash = ?", (time.time(), content_hash))
+        return row[0]
+
+
+def register_voice(source):
+    """
+    음성 파일을 등록하고 voice_id를 반환합니다. 같은 내용의 파일이 이미 등록되어 있으면 업로드하지 않습니다.
+    :param source: 음성 파일 경로 또는 읽기 가능한 파일 객체 (예: Streamlit 업로드 파일)
+    :return: voice_id 또는 None (업로드 실패)
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            content_hash = hash_audio(f)
+    else:
+        content_hash = hash_audio(source)
+
+    # 같은 파일을 동시에 등록하려는 요청이 중복 업로드하지 않도록 해시별로 잠급니다.
+    with striped_lock(content_hash, _hash_locks):
+        voice_id = lookup_voice(content_hash)
+        if voice_id is not None:
+            return voice_id
+
+        voice_id = upload_user_voice(source)
+        if voice_id is None:
+            return None
+        now = time.time()
+        with _connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO voices (content_hash, voice_id, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (content_hash, voice_id, now, now),
+            )
+
+    _maybe_collect()
+    return voice_id
+
+
+def touch_voice(voice_id):
+    """
+    음성을 사용했음을 기록합니다 (TTS에 사용할 때 호출).
+    """
+    with _connect() as conn:
+        conn.execute("UPDATE voices SET last_used_at = ? WHERE voice_id = ?", (time.time(), voice_id))
+
+
+def collect_unused_voices(max_idle_days=VOICE_MAX_IDLE_DAYS):
+    """
+    max_idle_days 동안 사용하지 않은 음성을 ElevenLabs와 레지스트리에서 삭제합니다.
+    :return: 삭제한 voice_id 리스트
+    """
+    cutoff = time.time() - max_idle_days * 86400
+    with _connect() as conn:
+        rows = conn.execute("SELECT content_hash, voice_id FROM voices WHERE last_used_at < ?", (cutoff,)).fetchall()
+
+    removed = []
+    for content_hash, voice_id in rows:
+        if not delete_user_voice(voice_id):
+            continue  # 삭제에 실패하면 다음 정리 때 다시 시도합니다
+        with _connect() as conn:
+            conn.execute("DELETE FROM voices WHERE content_hash = ?", (content_hash,))
+        removed.append(voice_id)
+    return removed
+
+
+def _maybe_collect():
+    # 등록할 때 VOICE_GC_INTERVAL마다 한 번씩 오래된 음성을 정리합니다.
+    # 삭제 요청이 등록한 사용자의 응답을 늦추지 않도록 백그라운드 스레드에서 실행합니다.
+    global _last_gc
+    with _lock:
+        if time.time() - _last_gc < VOICE_GC_INTERVAL:
+            return
+        _last_gc = time.time()
+    threading.Thread(target=_collect_in_background, name="voice-gc", daemon=True).start()
+
+
+def _collect_in_background():
+    try:
+        collect_unused_voices()
+    except Exception as e:
+        print(f"사용하지 않는 목소리 정리 중 오류 발생: {e}")